@@ -537,20 +537,37 @@ export default function ChatScreen() {
                     showSuccess("Cập nhật thành công");
                 }
             } else if (confirmationContext.request_type === "delete_expenses") {
+                const selection = confirmationContext.selection;
                 const selectedIds = confirmationContext.data
                     .filter((exp: any) => exp.submit === true)
                     .map((exp: any) => exp.id);
-                if (selectedIds.length === 0) {
+                const excludedIds = confirmationContext.data
+                    .filter((exp: any) => exp.submit !== true)
+                    .map((exp: any) => exp.id);
+                const selectedCount = selection
+                    ? selection.count - excludedIds.length
+                    : selectedIds.length;
+                if (selectedCount <= 0) {
                     showError("Bạn chưa chọn khoản nào để xóa.");
                     return;
                 }
-                response = await axios.put(
-                    `${Config.API_BASE_URL}/api/v1/user/expenses`,
-                    {
-                        delete_ids: selectedIds,
-                    },
-                    { headers: { Authorization: `Bearer ${token}` } }
-                );
+                // `data` is only a sample of the matched rows; the selection
+                // token deletes all of them minus the ones unticked here.
+                response = selection
+                    ? await axios.post(
+                          `${Config.API_BASE_URL}/api/v1/user/expenses/selections/${selection.token}/delete`,
+                          {
+                              exclude_ids: excludedIds,
+                          },
+                          { headers: { Authorization: `Bearer ${token}` } }
+                      )
+                    : await axios.put(
+                          `${Config.API_BASE_URL}/api/v1/user/expenses`,
+                          {
+                              delete_ids: selectedIds,
+                          },
+                          { headers: { Authorization: `Bearer ${token}` } }
+                      );
                 if (
                     response.data &&
                     response.data.deleted_count !== undefined
@@ -717,6 +734,7 @@ export default function ChatScreen() {
                     id: apiResponse.id.toString(),
                     request_type: content.request_type,
                     data: data,
+                    selection: content.data.selection,
                 });
                 newBotMessage = {
                     id: apiResponse.id.toString(),
@@ -725,6 +743,7 @@ export default function ChatScreen() {
                     confirmationData: {
                         request_type: content.request_type,
                         data: data,
+                        selection: content.data.selection,
                     },
                     timestamp: timestamp,
                 };
@@ -981,6 +1000,8 @@ export default function ChatScreen() {
                         message = {
                             id: item.id.toString(),
                             image: item.content.data,
+                            imageThumb: item.content.variants?.thumb,
+                            imageMedium: item.content.variants?.medium,
                             sender: "user",
                             timestamp: item.timestamp,
                         };
@@ -1073,6 +1094,7 @@ export default function ChatScreen() {
                             confirmationData: {
                                 request_type: item.content.request_type,
                                 data: data,
+                                selection: item.content.data.selection,
                             },
                         };
                     }
@@ -1095,6 +1117,7 @@ export default function ChatScreen() {
                         id: lastMessage.id,
                         request_type: lastMessage.confirmationData.request_type,
                         data: lastMessage.confirmationData.data,
+                        selection: lastMessage.confirmationData.selection,
                     });
                 }
             }
@@ -1144,6 +1167,8 @@ export default function ChatScreen() {
                                 return {
                                     id: item.id.toString(),
                                     image: item.content.data,
+                                    imageThumb: item.content.variants?.thumb,
+                                    imageMedium: item.content.variants?.medium,
                                     sender: "user",
                                     timestamp: item.timestamp,
                                 };
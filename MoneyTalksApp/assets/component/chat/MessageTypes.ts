@@ -7,10 +7,22 @@ export type Expense = {
     updated_at: string;
 };
 
+// Server-side handle on the full set matched by a chat delete request; `data`
+// only carries a sample of it.
+export type DeleteSelection = {
+    token: string;
+    count: number;
+    total_amount: number;
+    truncated: boolean;
+};
+
 export type Message = {
     id: string;
     text?: string;
     image?: string;
+    // Server-made WebP variants; the bubble shows the thumb, the viewer the medium.
+    imageThumb?: string;
+    imageMedium?: string;
     sender: "user" | "bot";
     timestamp: string;
     confirmationData?: {
@@ -20,6 +32,7 @@ export type Message = {
             | "update_expenses"
             | "delete_expenses";
         data: any;
+        selection?: DeleteSelection;
     };
     queryData?: {
         expenses: Expense[];
@@ -38,4 +51,5 @@ export type ConfirmationContext = {
         | "update_expenses"
         | "delete_expenses";
     data: any;
+    selection?: DeleteSelection;
 };
\ No newline at end of file
@@ -1,8 +1,19 @@
-import React from "react";
-import { View, Text, Image, StyleSheet, Dimensions } from "react-native";
+import React, { useState } from "react";
+import {
+    View,
+    Text,
+    Image,
+    Modal,
+    Pressable,
+    StyleSheet,
+    Dimensions,
+} from "react-native";
 import { Message } from "./MessageTypes";
 import { Config } from "../../../config";
 
+const imageUri = (path: string) =>
+    path.startsWith("file:///") ? path : Config.API_BASE_URL + "/" + path;
+
 type Props = {
     item: Message;
     isUser: boolean;
@@ -14,6 +25,8 @@ export default function StandardMessageBubble({
     isUser,
     formatTimestamp,
 }: Props) {
+    const [viewerOpen, setViewerOpen] = useState(false);
+
     return (
         <View
             style={
@@ -32,19 +45,39 @@ export default function StandardMessageBubble({
                     </Text>
                 )}
                 {item.image && (
-                    <Image
-                        source={{
-                            uri: item.image.toString().startsWith("file:///")
-                                ? item.image
-                                : Config.API_BASE_URL + "/" + item.image,
-                        }}
-                        style={styles.chatImage}
-                    />
+                    <Pressable onPress={() => setViewerOpen(true)}>
+                        <Image
+                            source={{
+                                uri: imageUri(item.imageThumb ?? item.image),
+                            }}
+                            style={styles.chatImage}
+                        />
+                    </Pressable>
                 )}
             </View>
             <Text style={styles.timestampText}>
                 {formatTimestamp(item.timestamp)}
             </Text>
+            {item.image && (
+                <Modal
+                    visible={viewerOpen}
+                    transparent
+                    animationType="fade"
+                    onRequestClose={() => setViewerOpen(false)}
+                >
+                    <Pressable
+                        style={styles.viewerBackdrop}
+                        onPress={() => setViewerOpen(false)}
+                    >
+                        <Image
+                            source={{
+                                uri: imageUri(item.imageMedium ?? item.image),
+                            }}
+                            style={styles.viewerImage}
+                        />
+                    </Pressable>
+                </Modal>
+            )}
         </View>
     );
 }
@@ -95,4 +128,15 @@ const styles = StyleSheet.create({
         borderRadius: 12,
         resizeMode: "cover",
     },
+    viewerBackdrop: {
+        flex: 1,
+        backgroundColor: "rgba(0, 0, 0, 0.9)",
+        justifyContent: "center",
+        alignItems: "center",
+    },
+    viewerImage: {
+        width: width,
+        height: "80%",
+        resizeMode: "contain",
+    },
 });
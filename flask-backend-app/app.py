@@ -1,3 +1,7 @@
+import time
+
+_load_started = time.perf_counter()
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
@@ -5,21 +9,50 @@ import os
 
 load_dotenv()
 
-from models import db  
-from routes import auth_bp, user_bp
+from models import db, init_db_command
+from routes import auth_bp, user_bp, admin_bp
+from seed_data import seed_data_command
+from message_archive import archive_messages_command
+from message_content import migrate_message_content_command
+from money import migrate_amounts_command
+from partitioning import partition_expenses_cli
+from services import purge_expense_selections_command
+from instrumentation import init_instrumentation, register_gauges
+from database import configure_database, pool_gauges
+from profiler import init_profiler
+from json_provider import FastJSONProvider
+from process_stats import record_app_load, process_gauges
+from image_pipeline import init_upload_caching
+from http_caching import init_http_caching
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app)
 
 db.init_app(app)  
+init_instrumentation(app)
+register_gauges(pool_gauges)
+register_gauges(process_gauges)
+init_profiler(app)
+init_upload_caching(app)
+init_http_caching(app)
 
 app.register_blueprint(auth_bp, url_prefix="/api/v1/auth")
 app.register_blueprint(user_bp, url_prefix="/api/v1/user")
+app.register_blueprint(admin_bp, url_prefix="/api/v1/admin")
+
+app.cli.add_command(init_db_command)
+app.cli.add_command(seed_data_command)
+app.cli.add_command(archive_messages_command)
+app.cli.add_command(migrate_message_content_command)
+app.cli.add_command(migrate_amounts_command)
+app.cli.add_command(partition_expenses_cli)
+app.cli.add_command(purge_expense_selections_command)
 
-with app.app_context():
-    db.create_all()
+record_app_load(time.perf_counter() - _load_started)
 
 if __name__ == "__main__":
     app.run(debug=True)
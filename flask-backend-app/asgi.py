@@ -0,0 +1,189 @@
+"""ASGI entry point.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+User text messages (POST /api/v1/user/message with role "user" and data_type
+"text") are handled on the event loop: the LLM calls go through the async
+OpenAI client, so a pending chat turn holds a coroutine instead of a thread.
+Their short DB steps run on a small thread pool sized like the engine pool.
+The turn runs inside a Flask app and request context with the app's
+before/after/teardown hooks, so metrics, Server-Timing, profiling and the
+per-route statement timeout apply as on the WSGI path. Every other request is
+passed to the Flask app unchanged.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.datastructures import Headers
+
+from app import app
+from models import db
+from rate_limit import limiter
+from routes import message_error_response
+from serializers import serialize_message
+from conversation_context import build_conversation_context
+from services import jwt_token_verify, save_user_text_message, extract_text_request_async, complete_text_request
+
+ASYNC_CHAT_PATH = "/api/v1/user/message"
+ASYNC_DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", os.getenv("DB_POOL_SIZE", 5)))
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", 10))
+
+wsgi_application = WSGIMiddleware(app, workers=WSGI_THREADS)
+_db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix="async-db")
+
+
+def _rollback_on_error(fn, *args):
+    try:
+        return fn(*args)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+async def run_db(fn, *args):
+    """Run a DB step on the pool, inside the turn's app and request context.
+
+    The steps of one turn run one after another, so they share the turn's
+    session and `g` (request metrics, statement timeout) across threads.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, context.run, _rollback_on_error, fn, *args)
+
+
+def _verify_user_id(headers):
+    return jwt_token_verify(headers).id
+
+
+def _save_user_message(user_id, content):
+    return serialize_message(save_user_text_message(user_id, content))
+
+
+async def chat_turn(headers, content):
+    """One chat turn, returning a Flask view's return value; errors map as in routes.post_message."""
+    try:
+        user_id = await run_db(_verify_user_id, headers)
+        if not content:
+            return {"error": "Empty message!"}, 400
+        # Off the loop: a shared backend is a network round trip.
+        await run_db(limiter.check, user_id, "text")
+
+        user_message = await run_db(_save_user_message, user_id, content)
+
+        async def load_context():
+            return await run_db(build_conversation_context, user_id, user_message["id"])
+
+        request_type, result = await extract_text_request_async(content, load_context)
+        assistant_message = await run_db(complete_text_request, user_id, request_type, result)
+
+        response = {"user_message": user_message, "assistant_message": assistant_message}
+        return {"msg": "Success", "response": response}, 200
+
+    except Exception as e:
+        # run_db has already rolled the session back.
+        return message_error_response(e)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _replay(body, receive):
+    """Give the WSGI app back a body the dispatcher already consumed."""
+    replayed = False
+
+    async def replay_receive():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay_receive
+
+
+async def _send_response(send, response):
+    raw_headers = [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in response.headers.items()]
+    await send({"type": "http.response.start", "status": response.status_code, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+def _wsgi_environ(scope, body):
+    """The WSGI environ a2wsgi would build for this request, body already read."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1"), value.decode("latin-1")
+        if name == "content-length":
+            continue
+        key = "CONTENT_TYPE" if name == "content-type" else f"HTTP_{name.upper().replace('-', '_')}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _handle_chat(scope, headers, body, content, send):
+    """chat_turn() wrapped in the same request lifecycle a Flask view gets."""
+    with app.app_context(), app.request_context(_wsgi_environ(scope, body)):
+        response = app.preprocess_request()
+        if response is None:
+            response = await chat_turn(headers, content)
+        response = app.process_response(app.make_response(response))
+        await _send_response(send, response)
+
+
+def _is_chat_request(scope, headers):
+    return (
+        scope["type"] == "http"
+        and scope["method"] == "POST"
+        and scope["path"] == ASYNC_CHAT_PATH
+        and headers.get("Content-Type", "").startswith("application/json")
+    )
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http":
+        headers = Headers([(key.decode("latin-1"), value.decode("latin-1")) for key, value in scope["headers"]])
+        if _is_chat_request(scope, headers):
+            body = await _read_body(receive)
+            if body is None:
+                return
+            try:
+                data = app.json.loads(body)
+            except ValueError:
+                data = None
+
+            if isinstance(data, dict) and data.get("role") == "user" and data.get("data_type", "text") == "text":
+                await _handle_chat(scope, headers, body, data.get("content", ""), send)
+                return
+            receive = _replay(body, receive)
+
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,171 @@
+"""Concurrent chat turns per worker: sync thread pool against the async path.
+
+Starts a local mock of the OpenAI chat completions endpoint that answers every
+structured-output request after a fixed latency, then runs the LLM part of a
+chat turn (classification plus extraction) at increasing concurrency:
+
+* sync  - services.extract_text_request on a pool of --threads threads, the way
+          one sync worker serves requests;
+* async - services.extract_text_request_async, every turn a coroutine on one
+          event loop, the way asgi.py serves them.
+
+The DB steps are left out, they are the same short queries on both paths.
+No database or API key is needed:
+
+    python -m benchmarks.bench_async_chat --latency-ms 800 --threads 8 --concurrency 10,100,1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MOCK_RESULTS = {
+    "DatabaseRequestType": {"request_type": "insert_expenses"},
+    "NewExpenses": {"expenses": [{"description": "Cà phê sáng", "amount": -35000, "expense_date": "2025-06-01"}]},
+    "Query": {"start_date": "2025-06-01", "end_date": "2025-06-30", "min_amount": None, "max_amount": 0, "key_words": ["cà phê"]},
+    "UpdateInfo": {"id": 1, "updated_description": None, "updated_amount": -40000, "updated_date": None},
+    "DeleteInfo": {"delete_ids": [1], "start_date": None, "end_date": None},
+    "Response": {"response": "Xin chào!"},
+}
+
+
+def completion_body(request_body):
+    schema_name = request_body.get("response_format", {}).get("json_schema", {}).get("name")
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request_body.get("model") or "mock",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": json.dumps(MOCK_RESULTS.get(schema_name, {}))},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+async def handle_connection(reader, writer, latency):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    content_length = int(value.strip())
+            request_body = json.loads(await reader.readexactly(content_length) or b"{}")
+
+            await asyncio.sleep(latency)
+            body = json.dumps(completion_body(request_body)).encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                + body
+            )
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_mock_llm(latency):
+    """Serve the mock on a background event loop, returns its base URL."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    address = {}
+
+    async def serve():
+        server = await asyncio.start_server(
+            lambda r, w: handle_connection(r, w, latency), "127.0.0.1", 0, backlog=4096
+        )
+        address["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+        await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+    started.wait()
+    return f"http://127.0.0.1:{address['port']}/v1"
+
+
+def summarize(name, concurrency, elapsed, latencies):
+    latencies.sort()
+    return {
+        "name": name,
+        "concurrency": concurrency,
+        "turns_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def run_sync(extract_text_request, concurrency, threads, content):
+    def turn(submitted_at):
+        extract_text_request(content)
+        return time.perf_counter() - submitted_at
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(turn, time.perf_counter()) for _ in range(concurrency)]
+        latencies = [future.result() for future in futures]
+    return summarize(f"sync ({threads} threads)", concurrency, time.perf_counter() - started, latencies)
+
+
+async def run_async(extract_text_request_async, concurrency, content):
+    async def turn():
+        turn_started = time.perf_counter()
+        await extract_text_request_async(content)
+        return time.perf_counter() - turn_started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(turn() for _ in range(concurrency)))
+    return summarize("async (1 event loop)", concurrency, time.perf_counter() - started, list(latencies))
+
+
+def print_results(results):
+    print(f"{'path':<22}  {'turns':>6}  {'turns/s':>9}  {'mean ms':>9}  {'p50 ms':>9}  {'p95 ms':>9}")
+    for result in results:
+        print(
+            f"{result['name']:<22}  {result['concurrency']:>6}  {result['turns_per_second']:>9.1f}  "
+            f"{result['mean_ms']:>9.1f}  {result['p50_ms']:>9.1f}  {result['p95_ms']:>9.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=800, help="Mock LLM response latency per call.")
+    parser.add_argument("--threads", type=int, default=8, help="Threads of the sync worker being compared.")
+    parser.add_argument("--concurrency", default="10,100,1000", help="Comma separated numbers of simultaneous turns.")
+    parser.add_argument("--content", default="hôm nay ăn sáng hết 35k")
+    args = parser.parse_args()
+
+    # The LLM client reads its settings at import time, point it at the mock first.
+    os.environ["API_BASE_URL"] = start_mock_llm(args.latency_ms / 1000)
+    os.environ.setdefault("API_KEY", "mock")
+    os.environ.setdefault("MODEL_NAME", "mock")
+    from services import extract_text_request, extract_text_request_async
+
+    levels = [int(value) for value in args.concurrency.split(",")]
+
+    async def run_async_levels():
+        # One loop for every level: the async client is bound to the loop it was created on.
+        return [await run_async(extract_text_request_async, concurrency, args.content) for concurrency in levels]
+
+    sync_results = [run_sync(extract_text_request, concurrency, args.threads, args.content) for concurrency in levels]
+    async_results = asyncio.run(run_async_levels())
+    print_results([result for pair in zip(sync_results, async_results) for result in pair])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Bytes on the wire and server CPU per response, uncompressed vs gzip vs brotli.
+
+Serializes representative /expenses, /message and /statistics/chart bodies
+with FastJSONProvider and reports, per encoding, the body size and the CPU
+time (process time, so waiting does not count) spent producing it. A 304 is
+shown for comparison: it carries headers only and skips the service call and
+serialization entirely. No database is needed:
+
+    python -m benchmarks.bench_compression --iterations 500
+"""
+import argparse
+import gzip
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import Flask, Response
+
+from benchmarks.bench_serialization import sample_page
+from http_caching import BROTLI_QUALITY, COMPRESS_MIN_BYTES, GZIP_LEVEL, brotli
+from json_provider import FastJSONProvider
+from message_content import assistant_text_content, confirmation_content, user_text_content
+from serializers import serialize_expense, serialize_message
+
+MessageRow = namedtuple("MessageRow", "id role content timestamp")
+
+
+def expenses_body(rows):
+    return {
+        "msg": "Success",
+        "expenses": [serialize_expense(row) for row in sample_page(rows)],
+        "page": 1,
+        "page_size": rows,
+        "total_pages": 20,
+        "total_records": rows * 20,
+    }
+
+
+def messages_body(count):
+    now = datetime(2025, 6, 1, 12, 30, 15)
+    contents = [
+        user_text_content("Sáng nay uống cà phê 35k với đồng nghiệp"),
+        confirmation_content("insert_expenses", {
+            "expenses": [{"description": "Cà phê", "amount": -35000, "expense_date": "2025-06-01"}], "error": None
+        }, template="insert_confirm"),
+        user_text_content("Tháng này tôi tiêu bao nhiêu cho ăn uống?"),
+        assistant_text_content("Bạn đã chi 1.250.000đ cho ăn uống trong tháng này.", request_type="other"),
+    ]
+    messages = [
+        MessageRow(1000 - n, "user" if n % 2 == 0 else "assistant", contents[n % len(contents)], now - timedelta(minutes=n))
+        for n in range(count)
+    ]
+    return {
+        "msg": "Success",
+        "messages": [serialize_message(message) for message in messages],
+        "pagination": {"next_cursor": 1000 - count + 1, "has_more": True},
+    }
+
+
+def chart_body(days):
+    labels = [(datetime(2025, 6, 1) - timedelta(days=n)).strftime("%d/%m") for n in reversed(range(days))]
+    return {
+        "msg": "Success",
+        "lineData": {
+            "labels": labels,
+            "datasets": [
+                {"data": [round(120.5 * (n % 7), 1) for n in range(days)], "type": "income"},
+                {"data": [round(85.25 * (n % 5), 2) for n in range(days)], "type": "expense"},
+            ],
+        },
+        "total_income": 12_500_000,
+        "total_expense": 8_750_000,
+        "unit": "k",
+    }
+
+
+def encoders():
+    yield "identity", lambda data: data
+    yield f"gzip -{GZIP_LEVEL}", lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if brotli:
+        yield f"br q{BROTLI_QUALITY}", lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+def cpu_ms(fn, iterations):
+    fn()
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) * 1000 / iterations
+
+
+def not_modified_bytes():
+    response = Response(status=304)
+    response.set_etag("u123-v987654-d2025-06-01", weak=True)
+    response.last_modified = datetime(2025, 6, 1, 12, 30, 15)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return len("HTTP/1.1 304 NOT MODIFIED\r\n") + sum(len(f"{k}: {v}\r\n") for k, v in response.headers.items()) + 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    provider = FastJSONProvider(Flask(__name__))
+    payloads = {
+        "/expenses 20 rows": lambda: expenses_body(20),
+        "/expenses 100 rows": lambda: expenses_body(100),
+        "/message 20 messages": lambda: messages_body(20),
+        "/statistics/chart 30d": lambda: chart_body(30),
+    }
+
+    print(f"compression threshold {COMPRESS_MIN_BYTES} bytes, brotli {'available' if brotli else 'not installed'}")
+    print(f"{'response':<24}  {'encoding':<9}  {'bytes':>7}  {'of raw':>7}  {'cpu ms':>7}")
+    for name, build in payloads.items():
+        raw = provider.dumps(build()).encode("utf-8")
+        for encoding, encode in encoders():
+            body = encode(raw)
+            cost = cpu_ms(lambda: encode(provider.dumps(build()).encode("utf-8")), args.iterations)
+            print(f"{name:<24}  {encoding:<9}  {len(body):>7}  {len(body) / len(raw):>6.0%}  {cost:>7.3f}")
+    print(f"{'304 revalidation':<24}  {'-':<9}  {not_modified_bytes():>7}  {'':>7}  {0:>7.3f}  (headers only, no service call)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Serialization cost of one 50-row /expenses page.
+
+Compares the previous path (hand-built dicts with .isoformat() and Flask's
+default JSON provider) with serializers.serialize_expense and FastJSONProvider.
+No database is needed:
+
+    python -m benchmarks.bench_serialization --iterations 2000
+"""
+import argparse
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.common import print_report, run_benchmark
+from json_provider import FastJSONProvider, orjson
+from serializers import serialize_expense
+
+ExpenseRow = namedtuple("ExpenseRow", "id amount description expense_date created_at updated_at")
+
+
+def sample_page(rows=50):
+    now = datetime(2025, 6, 1, 12, 30, 15, 123456)
+    return [
+        ExpenseRow(
+            id=100_000 + n,
+            amount=-35000.0 * (n + 1),
+            description=f"Cà phê sáng với đồng nghiệp số {n}",
+            expense_date=now - timedelta(days=n),
+            created_at=now - timedelta(days=n, hours=1),
+            updated_at=now - timedelta(days=n, minutes=5),
+        )
+        for n in range(rows)
+    ]
+
+
+def legacy_dict(exp):
+    return {
+        "id": exp.id,
+        "amount": exp.amount,
+        "description": exp.description,
+        "expense_date": exp.expense_date.isoformat(),
+        "created_at": exp.created_at.isoformat(),
+        "updated_at": exp.updated_at.isoformat(),
+    }
+
+
+def page_payload(expenses):
+    return {
+        "msg": "Success",
+        "expenses": expenses,
+        "page": 1,
+        "page_size": 50,
+        "total_pages": 20,
+        "total_records": 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = sample_page(args.rows)
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    results = [
+        run_benchmark("legacy dicts + default provider",
+                      lambda: default_provider.dumps(page_payload([legacy_dict(r) for r in rows])),
+                      iterations=args.iterations),
+        run_benchmark("serialize_expense + FastJSONProvider",
+                      lambda: fast_provider.dumps(page_payload([serialize_expense(r) for r in rows])),
+                      iterations=args.iterations),
+        run_benchmark("row dicts only (serialize_expense)",
+                      lambda: [serialize_expense(r) for r in rows],
+                      iterations=args.iterations),
+    ]
+    print(f"rows={args.rows} orjson={'yes' if orjson else 'no (stdlib fallback)'}")
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Micro-benchmarks for the service functions in services.py.
+
+Run against a database filled with `flask seed-data`:
+
+    python -m benchmarks.bench_services --iterations 50
+
+The heaviest seeded user (most expenses) is used so the numbers reflect the
+worst case; delete_all_user_messages runs on a separate scratch user so the
+seeded history is left alone. Functions that call the LLM (process_user_text_message,
+process_user_image_message) are not measured here.
+"""
+import argparse
+import functools
+from contextlib import contextmanager
+
+from sqlalchemy import func
+
+from app import app
+from benchmarks.common import print_report, run_benchmark
+from message_content import user_text_content
+from models import Message, User, UserExpense, db
+from seed_data import SEED_GOOGLE_ID_PREFIX
+import services
+
+BATCH_ROWS = 100
+SCRATCH_USER_INFO = {
+    "sub": "bench-scratch",
+    "email": "bench.scratch@example.com",
+    "name": "Bench scratch",
+    "picture": "https://example.com/avatar/bench.png",
+}
+
+
+def heaviest_seeded_user():
+    row = (
+        db.session.query(UserExpense.user_id, func.count(UserExpense.id).label("total"))
+        .join(User, User.id == UserExpense.user_id)
+        .filter(User.google_id.like(f"{SEED_GOOGLE_ID_PREFIX}%"))
+        .group_by(UserExpense.user_id)
+        .order_by(func.count(UserExpense.id).desc())
+        .first()
+    )
+    if not row:
+        raise SystemExit("No seeded data found, run `flask seed-data` first.")
+    return db.session.get(User, row.user_id)
+
+
+def latest_expense_date(user):
+    return db.session.query(func.max(UserExpense.expense_date)).filter(UserExpense.user_id == user.id).scalar()
+
+
+@contextmanager
+def statistics_anchored_at(today):
+    """Resolve "30d"/"1y" against the seeded data's last day rather than now.
+
+    Seeded dates end at a fixed anchor day, so today-relative ranges would
+    soon measure empty result sets.
+    """
+    get_date_range = services.get_date_range
+    services.get_date_range = functools.partial(get_date_range, today=today)
+    try:
+        yield
+    finally:
+        services.get_date_range = get_date_range
+
+
+def default_filters(**overrides):
+    filters = {
+        "sort": {"field": "expense_date", "order": "desc"},
+        "keyword": "",
+        "start_date": "",
+        "end_date": "",
+        "min_amount": "",
+        "max_amount": "",
+    }
+    filters.update(overrides)
+    return filters
+
+
+def collect_benchmarks(user):
+    sample_expense_id, sample_description = (
+        db.session.query(UserExpense.id, UserExpense.description).filter(UserExpense.user_id == user.id).first()
+    )
+    token = services.create_jwt(user)
+    headers = {"Authorization": f"Bearer {token}"}
+    user_info = {"sub": user.google_id, "email": user.email, "name": user.name, "picture": user.picture}
+
+    def add_then_delete():
+        added = services.add_user_expenses(
+            user.id, [{"amount": -25000, "description": "Bench", "expense_date": "2024-01-01"}]
+        )
+        services.delete_user_expense(user.id, added[0]["id"])
+
+    def update_then_restore():
+        services.update_user_expense(user.id, sample_expense_id, {"description": "Bench update"})
+        services.update_user_expense(user.id, sample_expense_id, {"description": sample_description})
+
+    def add_then_delete_many():
+        added = services.add_user_expenses(user.id, [
+            {"amount": -25000, "description": f"Bench {n}", "expense_date": "2024-01-01"} for n in range(BATCH_ROWS)
+        ])
+        services.delete_many_user_expenses(user.id, [expense["id"] for expense in added])
+
+    scratch_user_id = services.create_or_get_user(SCRATCH_USER_INFO).id
+
+    def add_then_delete_all_messages():
+        db.session.add_all([
+            Message(user_id=scratch_user_id, role="user", content=user_text_content(f"bench {n}"))
+            for n in range(BATCH_ROWS)
+        ])
+        db.session.commit()
+        services.delete_all_user_messages(scratch_user_id)
+
+    def post_then_delete_message():
+        response = services.process_assistant_response_message(user.id, "bench")
+        services.delete_user_message(user.id, response["assistant_message"]["id"])
+
+    return [
+        ("jwt_token_verify", lambda: services.jwt_token_verify(headers)),
+        ("create_or_get_user+create_jwt", lambda: services.create_jwt(services.create_or_get_user(user_info))),
+        ("get_user_messages_paginated", lambda: services.get_user_messages_paginated(user.id, 20, None)),
+        ("get_user_expenses[default]", lambda: services.get_user_expenses(user.id, default_filters(), 1, 50)),
+        ("get_user_expenses[deep page]", lambda: services.get_user_expenses(user.id, default_filters(), 200, 50)),
+        ("get_user_expenses[keyword]", lambda: services.get_user_expenses(user.id, default_filters(keyword="cà phê"), 1, 50)),
+        ("get_user_expenses[date+amount]", lambda: services.get_user_expenses(
+            user.id, default_filters(start_date="2024-01-01", end_date="2024-12-31", max_amount="-100000"), 1, 50)),
+        ("get_user_single_expense", lambda: services.get_user_single_expense(user.id, sample_expense_id)),
+        ("add_user_expenses+delete_user_expense", add_then_delete),
+        ("update_user_expense+restore", update_then_restore),
+        (f"add_user_expenses+delete_many_user_expenses[{BATCH_ROWS}]", add_then_delete_many),
+        ("process_assistant_response_message+delete", post_then_delete_message),
+        (f"add messages+delete_all_user_messages[{BATCH_ROWS}]", add_then_delete_all_messages),
+        ("get_user_statistics_summary[30d]", lambda: services.get_user_statistics_summary(user.id, "30d", "10")),
+        ("get_user_statistics_summary[1y]", lambda: services.get_user_statistics_summary(user.id, "1y", "10")),
+        ("get_user_statistics_chart_data[30d]", lambda: services.get_user_statistics_chart_data(user.id, "30d")),
+        ("get_user_statistics_chart_data[1y]", lambda: services.get_user_statistics_chart_data(user.id, "1y")),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text.")
+    args = parser.parse_args()
+
+    with app.app_context(), app.test_request_context():
+        user = heaviest_seeded_user()
+        results = []
+        with statistics_anchored_at(latest_expense_date(user)):
+            for name, fn in collect_benchmarks(user):
+                if args.filter and args.filter not in name:
+                    continue
+                results.append(run_benchmark(name, fn, iterations=args.iterations))
+        print(f"user_id={user.id}")
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
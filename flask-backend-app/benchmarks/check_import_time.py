@@ -0,0 +1,91 @@
+"""Import-time budget for what every worker, CLI command and script loads.
+
+Imports the module in a fresh interpreter with `-X importtime` and fails
+(exit status 1) when the cumulative import time is over budget or when a
+module that should only load on first use was imported:
+
+    python -m benchmarks.check_import_time --module app --budget-ms 1500
+
+No database is needed, engines are created without connecting.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Loaded lazily through llm_services.registry and inside the image handler.
+LAZY_MODULES = [
+    "openai",
+    "pydantic",
+    "PIL",
+    "llm_services.get_request_type_params",
+    "llm_services.get_insert_request_params",
+    "llm_services.get_query_request_params",
+    "llm_services.get_update_request_params",
+    "llm_services.get_delete_request_params",
+    "llm_services.other_message_process",
+    "llm_services.get_insert_request_params_img",
+]
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module):
+    """Return ({imported module: cumulative_us}, total_us) for one cold import."""
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/import_check")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    imports = {}
+    total = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imports[name] = int(cumulative_us)
+        if name == module:
+            total = int(cumulative_us)
+    return imports, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app", help="Module to import, e.g. app, services or routes.")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Allowed cumulative import time (median).")
+    parser.add_argument("--repeat", type=int, default=5, help="Cold imports to take the median of.")
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest packages to list.")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    imports = runs[-1][0]
+    median_ms = statistics.median(total for _, total in runs) / 1000
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.repeat} runs (budget {args.budget_ms:.0f} ms)")
+    packages = sorted(
+        ((name, cumulative) for name, cumulative in imports.items() if "." not in name),
+        key=lambda item: item[1], reverse=True,
+    )
+    for name, cumulative in packages[:args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+    failures = []
+    if median_ms > args.budget_ms:
+        failures.append(f"import time {median_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    eager = [name for name in LAZY_MODULES if name in imports]
+    if eager:
+        failures.append(f"imported eagerly, should load on first use: {', '.join(eager)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import statistics
+import time
+
+
+def run_benchmark(name, fn, iterations=50, warmup=3):
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    return {
+        "name": name,
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def print_report(results):
+    width = max(len(result["name"]) for result in results)
+    print(f"{'benchmark':<{width}}  {'n':>5}  {'mean ms':>9}  {'p50 ms':>9}  {'p95 ms':>9}")
+    for result in results:
+        print(
+            f"{result['name']:<{width}}  {result['iterations']:>5}  "
+            f"{result['mean_ms']:>9.2f}  {result['p50_ms']:>9.2f}  {result['p95_ms']:>9.2f}"
+        )
@@ -0,0 +1,82 @@
+from sqlalchemy import insert, select, text
+
+from models import db, ChangeLog
+
+CHANGE_LOG_LOCK_NAMESPACE = 7301
+
+ENTITY_EXPENSE = "expense"
+ENTITY_MESSAGE = "message"
+
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+OP_CLEAR = "clear"
+
+change_log_table = ChangeLog.__table__
+
+def record_changes(user_id, entity, op, entity_ids=None):
+    """Append change rows in the caller's transaction, before it commits.
+
+    A per-user advisory lock is held until commit so a user's change ids are
+    committed in increasing order and a client cursor never skips a change.
+    OP_CLEAR takes no ids and means every row of `entity` up to this version.
+    """
+    if op != OP_CLEAR and not entity_ids:
+        return
+
+    db.session.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, :user_id)"),
+        {"namespace": CHANGE_LOG_LOCK_NAMESPACE, "user_id": user_id}
+    )
+
+    if op == OP_CLEAR:
+        rows = [{"user_id": user_id, "entity": entity, "entity_id": None, "op": op}]
+    else:
+        rows = [
+            {"user_id": user_id, "entity": entity, "entity_id": entity_id, "op": op}
+            for entity_id in entity_ids
+        ]
+    db.session.execute(insert(ChangeLog), rows)
+
+def current_version(user_id):
+    return db.session.execute(
+        select(change_log_table.c.id)
+        .where(change_log_table.c.user_id == user_id)
+        .order_by(change_log_table.c.id.desc())
+        .limit(1)
+    ).scalar() or 0
+
+def latest_change(user_id):
+    """(id, changed_at) of the user's last change, None before the first one."""
+    return db.session.execute(
+        select(change_log_table.c.id, change_log_table.c.changed_at)
+        .where(change_log_table.c.user_id == user_id)
+        .order_by(change_log_table.c.id.desc())
+        .limit(1)
+    ).first()
+
+def collect_changes(user_id, since, limit):
+    """Return the net effect of the changes after `since`, last change per row wins."""
+    rows = db.session.execute(
+        select(change_log_table.c.id, change_log_table.c.entity, change_log_table.c.entity_id, change_log_table.c.op)
+        .where(change_log_table.c.user_id == user_id, change_log_table.c.id > since)
+        .order_by(change_log_table.c.id)
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = {
+        ENTITY_EXPENSE: {"ops": {}, "cleared": False},
+        ENTITY_MESSAGE: {"ops": {}, "cleared": False},
+    }
+    for row in rows:
+        entity_changes = changes[row.entity]
+        if row.op == OP_CLEAR:
+            entity_changes["ops"].clear()
+            entity_changes["cleared"] = True
+        else:
+            entity_changes["ops"][row.entity_id] = row.op
+
+    cursor = rows[-1].id if rows else since
+    return changes, cursor, has_more
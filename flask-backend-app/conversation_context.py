@@ -0,0 +1,182 @@
+import json
+import math
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db, ConversationHistory
+from change_tracking import change_log_table, ENTITY_EXPENSE, OP_UPSERT
+from message_content import CONTENT_VERSION, compact_content, content_text
+from read_path import expense_table, message_table, select_expenses
+
+# Conversation context for extractors that resolve references such as
+# "xóa khoản vừa thêm". A turn sees the expenses touched last, the last few
+# messages verbatim and, before those, a stored history of shortened lines for
+# the messages that left that window. The history is a bounded transcript,
+# not a model-written summary: it keeps the newest CONTEXT_HISTORY_LINES lines,
+# and all of it is cut to a fixed token budget so prompt size stays bounded
+# however long the chat is.
+CONTEXT_RECENT_MESSAGES = int(os.getenv("CONTEXT_RECENT_MESSAGES", 6))
+CONTEXT_RECENT_EXPENSES = int(os.getenv("CONTEXT_RECENT_EXPENSES", 5))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+CONTEXT_HISTORY_LINES = int(os.getenv("CONTEXT_HISTORY_LINES", 20))
+CONTEXT_LINE_MAX_CHARS = 200
+# Rough count for Vietnamese text, no tokenizer dependency; the budget is a
+# ceiling on prompt growth, not an exact figure.
+CHARS_PER_TOKEN = 3
+
+history_table = ConversationHistory.__table__
+
+ROLE_LABELS = {"user": "Người dùng", "assistant": "Trợ lý"}
+SECTION_TITLES = {
+    "history": "Tin nhắn cũ hơn (rút gọn):",
+    "messages": "Tin nhắn gần đây:",
+    "expenses": "Khoản thu chi vừa thêm hoặc sửa gần đây (mới nhất trước):",
+}
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate(text):
+    text = " ".join(str(text).split())
+    if len(text) > CONTEXT_LINE_MAX_CHARS:
+        return text[:CONTEXT_LINE_MAX_CHARS - 1] + "…"
+    return text
+
+
+def message_line(message):
+    """One short line for a stored message, e.g. "Người dùng: thêm 20k cà phê"."""
+    content = compact_content(message.content)
+    label = ROLE_LABELS.get(message.role, message.role)
+    if not isinstance(content, dict) or content.get("v") != CONTENT_VERSION:
+        return _truncate(f"{label}: {json.dumps(content, ensure_ascii=False)}")
+
+    kind = content["t"]
+    if kind == "i":
+        text = "[ảnh hóa đơn]"
+    elif kind == "c":
+        data = json.dumps(content.get("d"), ensure_ascii=False, default=str)
+        text = f"({content['r']}) {content_text(content)} {data}"
+    else:
+        text = content_text(content) or ""
+    return _truncate(f"{label}: {text}")
+
+
+def expense_line(expense):
+    return _truncate(
+        f"#{expense.id} | {expense.expense_date.date().isoformat()} | {expense.amount} | {expense.description}"
+    )
+
+
+def recent_messages(user_id, before_id, limit=CONTEXT_RECENT_MESSAGES):
+    """The user's last messages before `before_id`, newest first, off the (user_id, id) index."""
+    statement = select(message_table.c.id, message_table.c.role, message_table.c.content).where(
+        message_table.c.user_id == user_id
+    )
+    if before_id:
+        statement = statement.where(message_table.c.id < before_id)
+    return db.session.execute(statement.order_by(message_table.c.id.desc()).limit(limit)).all()
+
+
+def recent_expenses(user_id, limit=CONTEXT_RECENT_EXPENSES):
+    """Expenses the user added or edited last, found through the change log."""
+    changed_ids = db.session.execute(
+        select(change_log_table.c.entity_id)
+        .where(
+            change_log_table.c.user_id == user_id,
+            change_log_table.c.entity == ENTITY_EXPENSE,
+            change_log_table.c.op == OP_UPSERT
+        )
+        .order_by(change_log_table.c.id.desc())
+        .limit(limit * 4)
+    ).scalars().all()
+    # Most recent change first, each expense once.
+    expense_ids = list(dict.fromkeys(changed_ids))[:limit]
+    if not expense_ids:
+        return []
+    rows = db.session.execute(
+        select_expenses().where(expense_table.c.user_id == user_id, expense_table.c.id.in_(expense_ids))
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[expense_id] for expense_id in expense_ids if expense_id in by_id]
+
+
+def refresh_history(user_id, window_start_id):
+    """Append the messages that left the recent window to the user's stored history.
+
+    Only messages after the last folded one are read, and no more than the
+    history keeps, so the cost per turn does not grow with the chat.
+    """
+    stored = db.session.get(ConversationHistory, user_id)
+    lines = stored.lines.splitlines() if stored else []
+    last_message_id = stored.last_message_id if stored else 0
+    if not window_start_id or window_start_id <= last_message_id:
+        return lines
+
+    folded = recent_messages(user_id, window_start_id, CONTEXT_HISTORY_LINES)
+    folded = [message for message in folded if message.id > last_message_id]
+    if not folded:
+        return lines
+
+    lines = (lines + [message_line(message) for message in reversed(folded)])[-CONTEXT_HISTORY_LINES:]
+    values = {
+        "user_id": user_id,
+        "lines": "\n".join(lines),
+        "last_message_id": folded[0].id,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    statement = pg_insert(history_table).values(**values)
+    # Two turns at once may fold the same messages; the one that got further wins.
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[history_table.c.user_id],
+        set_={key: statement.excluded[key] for key in ("lines", "last_message_id", "updated_at")},
+        where=history_table.c.last_message_id < statement.excluded.last_message_id
+    ))
+    db.session.commit()
+    return lines
+
+
+def reset_history(user_id):
+    """Drop the stored history after messages are deleted, the next turn rebuilds it."""
+    db.session.execute(delete(history_table).where(history_table.c.user_id == user_id))
+
+
+def _take_within(lines, budget):
+    """Lines from the front of `lines` that fit in `budget` tokens, and what is left of it."""
+    taken = []
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if cost > budget:
+            break
+        taken.append(line)
+        budget -= cost
+    return taken, budget
+
+
+def build_conversation_context(user_id, before_id=None, budget=CONTEXT_TOKEN_BUDGET):
+    """Context text for the turn whose message is `before_id`, None when there is nothing to add.
+
+    The budget is spent on recent expenses first, then recent messages newest
+    first, then the older history newest first.
+    """
+    messages = recent_messages(user_id, before_id)
+    history_lines = refresh_history(user_id, messages[-1].id if messages else None)
+    expense_lines = [expense_line(expense) for expense in recent_expenses(user_id)]
+
+    budget -= sum(estimate_tokens(title) + 1 for title in SECTION_TITLES.values())
+    expense_lines, budget = _take_within(expense_lines, budget)
+    message_lines, budget = _take_within([message_line(message) for message in messages], budget)
+    history_lines, budget = _take_within(reversed(history_lines), budget)
+
+    sections = {
+        "history": list(reversed(history_lines)),
+        "messages": list(reversed(message_lines)),
+        "expenses": expense_lines,
+    }
+    return "\n\n".join(
+        "\n".join([SECTION_TITLES[name], *lines]) for name, lines in sections.items() if lines
+    ) or None
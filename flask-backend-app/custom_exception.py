@@ -8,4 +8,18 @@ class NotFoundError(Exception):
 
 class LlmServiceError(Exception):
     """Exception raised for errors in the LLM service."""
-    pass
\ No newline at end of file
+    pass
+
+class ForbiddenError(Exception):
+    """Exception raised when a caller is not allowed to use an endpoint."""
+    pass
+
+class RateLimitExceeded(Exception):
+    """Exception raised when a user has used up their request budget."""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class InvalidImageError(Exception):
+    """Exception raised when an uploaded image cannot be read or is not allowed."""
+    pass
@@ -0,0 +1,117 @@
+import functools
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+REPLICA_BIND_KEY = "replica"
+
+# Heavy read endpoints get a tighter budget than the default; override with
+# DB_ROUTE_STATEMENT_TIMEOUTS_MS='{"user.get_expenses": 3000}' (endpoint name -> ms).
+DEFAULT_ROUTE_STATEMENT_TIMEOUTS_MS = {
+    "user.get_statistics_summary": 10000,
+    "user.get_statistics_chart_data": 10000,
+}
+
+_use_replica = ContextVar("use_replica", default=False)
+
+class RoutingSession(Session):
+    """Session that sends reads made inside read_only()/replica_reads() to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_replica.get() and not self._flushing:
+            replica = self._db.engines.get(REPLICA_BIND_KEY)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@contextmanager
+def replica_reads():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+def read_only(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return fn(*args, **kwargs)
+    return wrapper
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+def engine_options_from_env():
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", "true"),
+    }
+    statement_timeout_ms = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+    if statement_timeout_ms:
+        options["connect_args"] = {"options": f"-c statement_timeout={int(statement_timeout_ms)}"}
+    return options
+
+def route_statement_timeouts():
+    timeouts = dict(DEFAULT_ROUTE_STATEMENT_TIMEOUTS_MS)
+    timeouts.update(json.loads(os.getenv("DB_ROUTE_STATEMENT_TIMEOUTS_MS", "{}")))
+    return timeouts
+
+def _set_route_statement_timeout(session, transaction, connection):
+    if not has_request_context():
+        return
+    timeout_ms = g.get("statement_timeout_ms")
+    if timeout_ms:
+        connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+
+def pool_gauges():
+    from models import db
+
+    samples = {"checked_out": [], "checked_in": [], "overflow": [], "size": []}
+    for bind_key, engine in db.engines.items():
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        labels = {"bind": bind_key or "primary"}
+        samples["checked_out"].append((labels, pool.checkedout()))
+        samples["checked_in"].append((labels, pool.checkedin()))
+        samples["overflow"].append((labels, pool.overflow()))
+        samples["size"].append((labels, pool.size()))
+
+    return [
+        ("moneytalks_db_pool_checked_out", "Connections currently checked out of the pool.", samples["checked_out"]),
+        ("moneytalks_db_pool_checked_in", "Idle connections in the pool.", samples["checked_in"]),
+        ("moneytalks_db_pool_overflow", "Overflow connections in use beyond pool_size.", samples["overflow"]),
+        ("moneytalks_db_pool_size", "Configured pool size.", samples["size"]),
+    ]
+
+def dispose_engines():
+    """Forget pooled connections inherited over fork, leaving them open for the parent."""
+    from models import db
+
+    for engine in db.engines.values():
+        engine.dispose(close=False)
+
+def configure_database(app):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env()
+
+    replica_url = os.getenv("DATABASE_REPLICA_URL")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND_KEY: replica_url}
+
+    timeouts = route_statement_timeouts()
+
+    @app.before_request
+    def set_statement_timeout():
+        g.statement_timeout_ms = timeouts.get(request.endpoint)
+
+    if not event.contains(RoutingSession, "after_begin", _set_route_statement_timeout):
+        event.listen(RoutingSession, "after_begin", _set_route_statement_timeout)
@@ -0,0 +1,52 @@
+import csv
+import io
+import zlib
+
+from flask import current_app
+
+from serializers import serialize_expense
+
+EXPENSE_EXPORT_FIELDS = ["id", "amount", "description", "expense_date", "created_at", "updated_at"]
+
+EXPORT_FORMATS = {
+    "csv": {"mimetype": "text/csv", "extension": "csv"},
+    "ndjson": {"mimetype": "application/x-ndjson", "extension": "ndjson"},
+}
+
+def csv_chunks(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # The BOM lets spreadsheet apps open Vietnamese descriptions as UTF-8.
+    buffer.write("\ufeff")
+    writer.writerow(EXPENSE_EXPORT_FIELDS)
+    yield buffer.getvalue().encode("utf-8")
+
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (
+                row.id,
+                row.amount,
+                row.description,
+                row.expense_date.isoformat(),
+                row.created_at.isoformat() if row.created_at else "",
+                row.updated_at.isoformat() if row.updated_at else "",
+            )
+            for row in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+
+def ndjson_chunks(partitions):
+    dumps = current_app.json.dumps
+    for rows in partitions:
+        yield "".join(f"{dumps(serialize_expense(row))}\n" for row in rows).encode("utf-8")
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,87 @@
+"""Gunicorn settings, each one can be overridden from the environment.
+
+    gunicorn -c gunicorn.conf.py                      # wsgi.py on gthread workers
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py     # asgi.py on uvicorn workers
+
+The app is imported once in the master (preload) and the heap is frozen before
+forking, so workers share those pages copy-on-write instead of each importing
+everything again. Because the code lives in the master, a deploy needs a new
+master: send USR2 to start one next to the old, then TERM the old master once
+the new workers are up. HUP only replaces the workers. TERM lets workers
+finish in-flight requests for up to graceful_timeout seconds.
+"""
+import gc
+import os
+import time
+
+_config_loaded_at = time.perf_counter()
+
+
+def _env_flag(name, default):
+    return os.getenv(name, str(int(default))).lower() in ("1", "true", "yes")
+
+
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "wsgi:application"
+    worker_class = "gthread"
+
+preload_app = _env_flag("GUNICORN_PRELOAD", True)
+# LLM and vision calls routinely take tens of seconds.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    from process_stats import app_load_seconds, memory_usage, format_memory
+
+    if preload_app:
+        # services resolves extractors and PIL lazily; import them here once so
+        # workers share them instead of each paying the import on first use.
+        from llm_services.registry import preload
+        preload(extra_modules=("PIL.Image",))
+
+        # Move everything imported so far out of the collector's reach, otherwise
+        # the first collection in each worker touches (and copies) every page.
+        gc.collect()
+        gc.freeze()
+
+    load_seconds = app_load_seconds()
+    server.log.info(
+        "Master ready in %.2fs (app load %s), %s",
+        time.perf_counter() - _config_loaded_at,
+        f"{load_seconds:.2f}s" if load_seconds is not None else "deferred to workers",
+        format_memory(memory_usage()),
+    )
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from app import app
+    from database import dispose_engines
+
+    with app.app_context():
+        dispose_engines()
+
+
+def post_worker_init(worker):
+    from process_stats import memory_usage, format_memory
+    from profiler import install_toggle_signal
+
+    # Gunicorn resets USR2 in workers, put the profiler toggle back.
+    install_toggle_signal()
+    worker.log.info("Worker %s booted, %s", worker.pid, format_memory(memory_usage()))
@@ -0,0 +1,106 @@
+import gzip
+import os
+from datetime import datetime, time, timezone
+
+from flask import Response, g, request
+
+from change_tracking import latest_change
+from database import replica_reads
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies below this size are sent as is, the headers would eat the saving.
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+# Low qualities compress about as well as gzip -6 at a fraction of the CPU.
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+COMPRESSIBLE_MIMETYPES = {"application/json"}
+
+
+def data_validators(user_id, daily=False):
+    """(etag, last_modified) for a body that only depends on the user's data.
+
+    Every write to expenses or messages appends to the change log, so the last
+    change id is a version of everything the user can read. `daily` adds
+    today's date for responses built from ranges relative to today.
+
+    Read from the replica like the @read_only services building the body: a
+    lagging replica then gives an older version, never one newer than the data.
+    """
+    with replica_reads():
+        change = latest_change(user_id)
+    etag = f"u{user_id}-v{change.id if change else 0}"
+    last_modified = change.changed_at.replace(tzinfo=timezone.utc) if change else None
+    if daily:
+        today = datetime.now(timezone.utc).date()
+        etag += f"-d{today.isoformat()}"
+        midnight = datetime.combine(today, time.min, tzinfo=timezone.utc)
+        last_modified = max(last_modified, midnight) if last_modified else midnight
+    return etag, last_modified
+
+
+def not_modified_response(user_id, daily=False):
+    """A 304 when the client's copy is current, None when the view has to run.
+
+    Call before any service work. The validators are kept for the 200 the view
+    returns otherwise. Only the ETag decides: If-Modified-Since has one-second
+    resolution and would hide a second write made in the same second.
+    """
+    etag, last_modified = data_validators(user_id, daily)
+    g.data_validators = (etag, last_modified)
+
+    if request.if_none_match.contains_weak(etag):
+        return _with_validators(Response(status=304))
+    return None
+
+
+def _with_validators(response):
+    etag, last_modified = g.data_validators
+    # Weak: the same version is valid whatever encoding it was sent in.
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _add_validators(response):
+    if response.status_code == 200 and g.get("data_validators"):
+        _with_validators(response)
+    return response
+
+
+def _compress(response):
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli and accepted["br"]:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def init_http_caching(app):
+    """Conditional GET validators and size-thresholded gzip/brotli for JSON responses."""
+    # after_request hooks run in reverse, so validators are set before compressing.
+    app.after_request(_compress)
+    app.after_request(_add_validators)
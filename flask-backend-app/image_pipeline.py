@@ -0,0 +1,173 @@
+import io
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import request
+
+from custom_exception import InvalidImageError
+
+MAX_FILE_SIZE = 2 * 1024 * 1024
+SUPPORTED_FORMATS = {"JPEG": "jpg", "PNG": "png"}
+
+MAX_IMAGES_PER_MESSAGE = int(os.getenv("MAX_IMAGES_PER_MESSAGE", 10))
+IMAGE_PROCESS_WORKERS = int(os.getenv("IMAGE_PROCESS_WORKERS", min(4, os.cpu_count() or 1)))
+# WebP derivatives written next to each upload, longest side in pixels. The
+# chat list shows "thumb", the image viewer "medium", the original stays for
+# downloads and the vision model.
+IMAGE_VARIANTS = {"thumb": 320, "medium": 1280}
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+# Upload names are unique and never rewritten, so browsers may keep them for good.
+UPLOAD_CACHE_MAX_AGE = int(os.getenv("UPLOAD_CACHE_MAX_AGE", 365 * 24 * 3600))
+UPLOAD_URL_PREFIX = "/static/uploads/"
+
+# Vision calls in flight for one upload; each one holds a connection to the LLM.
+IMAGE_VISION_CONCURRENCY = int(os.getenv("IMAGE_VISION_CONCURRENCY", 4))
+
+# Created on the first multi-image upload. Spawned rather than forked: a
+# gthread worker has other threads and open DB connections, and the children
+# only import this module, Flask and PIL.
+_process_pool = None
+
+
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def _remove_uploads(upload_folder, filenames):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(upload_folder, filename))
+        except FileNotFoundError:
+            pass
+
+
+def prepare_image(data, upload_folder, filename_stem):
+    """Validate an uploaded image and write it and its variants to the upload folder.
+
+    Images over MAX_FILE_SIZE are re-encoded. Returns (file name, {variant: file
+    name}); on failure nothing is left behind, and unreadable or oversized
+    images raise InvalidImageError. Runs in the process pool, so it takes and returns
+    plain values only.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise InvalidImageError("Không đọc được ảnh hoặc ảnh quá lớn") from e
+    img_format = (image.format or "").upper()
+    if img_format not in SUPPORTED_FORMATS:
+        raise InvalidImageError("Định dạng ảnh không được hỗ trợ")
+
+    filename = f"{filename_stem}.{SUPPORTED_FORMATS[img_format]}"
+    save_path = os.path.join(upload_folder, filename)
+    # Names are added before writing so a half-written file is removed too.
+    written = [filename]
+    try:
+        if len(data) > MAX_FILE_SIZE:
+            save_args = {"format": img_format, "optimize": True}
+            if img_format == "JPEG":
+                save_args["quality"] = 70
+            image.save(save_path, **save_args)
+        else:
+            with open(save_path, "wb") as f:
+                f.write(data)
+
+        # Phone photos carry their rotation in EXIF, which is dropped on re-encode.
+        upright = ImageOps.exif_transpose(image)
+        if upright.mode not in ("RGB", "RGBA"):
+            upright = upright.convert("RGBA" if "transparency" in upright.info or upright.mode == "LA" else "RGB")
+        variants = {}
+        for name, longest_side in IMAGE_VARIANTS.items():
+            variant = upright.copy()
+            variant.thumbnail((longest_side, longest_side))
+            variants[name] = f"{filename_stem}_{name}.webp"
+            written.append(variants[name])
+            variant.save(os.path.join(upload_folder, variants[name]), format="WEBP", quality=WEBP_QUALITY, method=4)
+    except Exception:
+        _remove_uploads(upload_folder, written)
+        raise
+    return filename, variants
+
+
+def prepare_images(images, upload_folder):
+    """prepare_image() for each (data, filename_stem), in the process pool when there are several.
+
+    All or nothing: when one image fails, the files of the others are removed
+    and the first error is raised.
+    """
+    if len(images) == 1:
+        return [prepare_image(images[0][0], upload_folder, images[0][1])]
+    pool = get_process_pool()
+    futures = [pool.submit(prepare_image, data, upload_folder, stem) for data, stem in images]
+    prepared, error = [], None
+    for future in futures:
+        try:
+            prepared.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        for filename, variants in prepared:
+            _remove_uploads(upload_folder, [filename, *variants.values()])
+        raise error
+    return prepared
+
+
+def extract_all(extractor, paths, concurrency=IMAGE_VISION_CONCURRENCY):
+    """Run the vision extractor over every image, at most `concurrency` at a time, in input order.
+
+    The calls run outside the request context, callers time the batch as a whole.
+    """
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(paths)), thread_name_prefix="vision") as executor:
+        return list(executor.map(extractor, paths))
+
+
+def _expense_key(expense):
+    description = " ".join((expense.get("description") or "").casefold().split())
+    return description, expense.get("amount"), expense.get("expense_date")
+
+
+def merge_expenses(expense_lists):
+    """Merge the expenses read from several shots of one receipt.
+
+    Overlapping shots repeat the lines at their edges, so an expense is kept as
+    many times as the image with the most copies of it has it: repeats within
+    one image (two identical items) survive, repeats across images do not.
+    """
+    kept = Counter()
+    merged = []
+    for expenses in expense_lists:
+        seen = Counter()
+        for expense in expenses:
+            key = _expense_key(expense)
+            seen[key] += 1
+            if seen[key] > kept[key]:
+                kept[key] += 1
+                merged.append(expense)
+    return merged
+
+
+def upload_url(filename):
+    return f"{UPLOAD_URL_PREFIX}{filename}"
+
+
+def _cache_uploads(response):
+    if request.path.startswith(UPLOAD_URL_PREFIX) and response.status_code in (200, 304):
+        # send_file marks static files no-cache, which would force a revalidation each time.
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = UPLOAD_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def init_upload_caching(app):
+    """Serve uploaded images and their variants with long-lived cache headers."""
+    app.after_request(_cache_uploads)
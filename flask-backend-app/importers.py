@@ -0,0 +1,152 @@
+import csv
+import hashlib
+import io
+import re
+from datetime import datetime
+
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d/%m/%y",
+    "%Y/%m/%d",
+]
+
+AMOUNT_SUFFIXES = {
+    "k": 1_000,
+    "nghìn": 1_000,
+    "ngàn": 1_000,
+    "tr": 1_000_000,
+    "triệu": 1_000_000,
+    "m": 1_000_000,
+    "tỷ": 1_000_000_000,
+    "ty": 1_000_000_000,
+}
+
+COLUMN_ALIASES = {
+    "date": ["date", "ngày", "ngay", "ngày giao dịch", "ngay giao dich", "transaction date", "posting date", "expense_date"],
+    "description": ["description", "mô tả", "mo ta", "nội dung", "noi dung", "diễn giải", "dien giai", "details", "memo"],
+    "amount": ["amount", "số tiền", "so tien", "giá trị", "gia tri"],
+    "debit": ["debit", "ghi nợ", "ghi no", "nợ", "tiền ra", "withdrawal"],
+    "credit": ["credit", "ghi có", "ghi co", "có", "tiền vào", "deposit"],
+}
+
+DEFAULT_DESCRIPTION = "Giao dịch ngân hàng"
+
+_AMOUNT_PATTERN = re.compile(r"^([+-]?)([\d.,]+)\s*([a-zà-ỹ]*)$")
+
+def parse_date(raw):
+    value = (raw or "").strip()
+    if not value:
+        raise ValueError("Thiếu ngày giao dịch")
+    candidates = [value, value.split(" ")[0], value.split("T")[0]]
+    for candidate in candidates:
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, date_format).date()
+            except ValueError:
+                continue
+    raise ValueError(f"Ngày không hợp lệ: {value}")
+
+def parse_amount(raw):
+    """Parse a VND amount such as "-50k", "1,5tr", "1.200.000 đ" or "(200,000)" into an int."""
+    value = (raw or "").strip().lower()
+    for currency in ["vnđ", "vnd", "đ", "₫"]:
+        value = value.replace(currency, "")
+    value = value.replace(" ", "")
+
+    negative = False
+    if value.startswith("(") and value.endswith(")"):
+        negative = True
+        value = value[1:-1]
+
+    match = _AMOUNT_PATTERN.match(value)
+    if not match or not any(ch.isdigit() for ch in match.group(2)):
+        raise ValueError(f"Số tiền không hợp lệ: {raw}")
+    sign, number, suffix = match.groups()
+
+    if suffix and suffix not in AMOUNT_SUFFIXES:
+        raise ValueError(f"Đơn vị tiền không hợp lệ: {raw}")
+
+    if suffix:
+        amount = float(number.replace(",", ".")) * AMOUNT_SUFFIXES[suffix]
+    else:
+        # VND has no minor unit: a separator followed by exactly three digits groups thousands.
+        last_separator = max(number.rfind("."), number.rfind(","))
+        if last_separator == -1 or len(number) - last_separator - 1 == 3:
+            amount = float(number.replace(".", "").replace(",", ""))
+        else:
+            integer_part = number[:last_separator].replace(".", "").replace(",", "")
+            amount = float(f"{integer_part or 0}.{number[last_separator + 1:]}")
+
+    amount = int(round(amount))
+    if sign == "-" or negative:
+        amount = -amount
+    return amount
+
+def dedupe_key(expense_date, amount, description):
+    text = f"{expense_date.isoformat()}|{int(amount)}|{description.strip().lower()}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def resolve_columns(fieldnames):
+    normalized = {name.strip().lower(): name for name in fieldnames if name}
+    columns = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[key] = normalized[alias]
+                break
+
+    if "date" not in columns:
+        raise ValueError("Không tìm thấy cột ngày trong file CSV")
+    if "amount" not in columns and "debit" not in columns and "credit" not in columns:
+        raise ValueError("Không tìm thấy cột số tiền trong file CSV")
+    return columns
+
+def normalize_row(row, columns):
+    expense_date = parse_date(row.get(columns["date"]))
+
+    if "amount" in columns:
+        amount = parse_amount(row.get(columns["amount"]))
+    else:
+        debit = row.get(columns.get("debit", ""), "") or ""
+        credit = row.get(columns.get("credit", ""), "") or ""
+        amount = (parse_amount(credit) if credit.strip() else 0) - (abs(parse_amount(debit)) if debit.strip() else 0)
+
+    if amount == 0:
+        raise ValueError("Số tiền bằng 0")
+
+    description = (row.get(columns["description"]) or "").strip() if "description" in columns else ""
+    description = (description or DEFAULT_DESCRIPTION)[:255]
+
+    return {"amount": amount, "description": description, "expense_date": expense_date}
+
+def read_csv_rows(binary_stream):
+    """Yield (line_number, row) from an uploaded CSV, decoding it incrementally."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", errors="replace", newline="")
+    sample = text_stream.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    def lines():
+        yield from io.StringIO(sample)
+        yield from text_stream
+
+    reader = csv.DictReader(_rejoin_lines(lines()), dialect=dialect)
+    columns = resolve_columns(reader.fieldnames or [])
+    for row in reader:
+        yield reader.line_num, row, columns
+
+def _rejoin_lines(lines):
+    # The 4KB sample usually ends mid-line, glue that fragment to the next line.
+    pending = ""
+    for line in lines:
+        pending += line
+        if pending.endswith("\n") or pending.endswith("\r"):
+            yield pending
+            pending = ""
+    if pending:
+        yield pending
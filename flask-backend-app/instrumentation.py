@@ -0,0 +1,235 @@
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from custom_exception import ForbiddenError
+
+# Metrics are kept per process; every worker exposes its own /metrics, which
+# takes the same X-Admin-Token as the admin routes.
+_metrics_lock = threading.Lock()
+_route_metrics = defaultdict(lambda: defaultdict(float))
+_llm_metrics = defaultdict(lambda: defaultdict(float))
+_gauge_sources = []
+
+LLM_FUNCTION_NAMES = [
+    "extract_request_type",
+    "extract_insert_req",
+    "extract_query_req",
+    "extract_update_req",
+    "extract_delete_req",
+    "other_message_process",
+    "extract_insert_req_from_local_image",
+]
+# Awaited by the ASGI chat path; counted under the same extractor names.
+LLM_ASYNC_FUNCTION_NAMES = [
+    "extract_request_type_async",
+    "extract_insert_req_async",
+    "extract_query_req_async",
+    "extract_update_req_async",
+    "extract_delete_req_async",
+    "other_message_process_async",
+]
+
+SERVER_TIMING_NAMES = {
+    "db": "db",
+    "llm": "llm",
+    "image": "img",
+    "serialize": "ser",
+}
+
+
+def _request_metrics():
+    if not has_request_context():
+        return None
+    return g.get("request_metrics")
+
+
+def record_timing(name, seconds, count=1):
+    metrics = _request_metrics()
+    if metrics is None:
+        return
+    metrics[f"{name}_seconds"] += seconds
+    metrics[f"{name}_count"] += count
+
+
+@contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def _record_llm(extractor, elapsed):
+    record_timing("llm", elapsed)
+    metrics = _request_metrics()
+    if metrics is not None:
+        metrics["llm_by_extractor"][extractor][0] += 1
+        metrics["llm_by_extractor"][extractor][1] += elapsed
+
+
+def instrument_llm(extractor, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record_llm(extractor, time.perf_counter() - started)
+    return wrapper
+
+
+def instrument_llm_async(extractor, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _record_llm(extractor, time.perf_counter() - started)
+    return wrapper
+
+
+# The start time lives on the execution context, which is dropped with the
+# statement, so a statement that fails leaves nothing behind on the connection.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "_query_started_at", None)
+    if started_at is None:
+        return
+    record_timing("db", time.perf_counter() - started_at)
+
+
+def _before_request():
+    g.request_metrics = defaultdict(float)
+    g.request_metrics["llm_by_extractor"] = defaultdict(lambda: [0, 0.0])
+    g.request_started_at = time.perf_counter()
+
+
+def _after_request(response):
+    metrics = _request_metrics()
+    if metrics is None:
+        return response
+
+    total = time.perf_counter() - g.request_started_at
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    method = request.method
+
+    with _metrics_lock:
+        route_metrics = _route_metrics[(route, method, str(response.status_code))]
+        route_metrics["requests"] += 1
+        route_metrics["duration_seconds"] += total
+        for name in SERVER_TIMING_NAMES:
+            route_metrics[f"{name}_seconds"] += metrics[f"{name}_seconds"]
+            route_metrics[f"{name}_count"] += metrics[f"{name}_count"]
+        for extractor, (calls, seconds) in metrics["llm_by_extractor"].items():
+            llm_metrics = _llm_metrics[(route, extractor)]
+            llm_metrics["calls"] += calls
+            llm_metrics["duration_seconds"] += seconds
+
+    timings = [
+        f'{short};desc="{int(metrics[f"{name}_count"])}x";dur={metrics[f"{name}_seconds"] * 1000:.1f}'
+        for name, short in SERVER_TIMING_NAMES.items()
+        if metrics[f"{name}_count"]
+    ]
+    timings.append(f"total;dur={total * 1000:.1f}")
+    response.headers.add("Server-Timing", ", ".join(timings))
+    return response
+
+
+def register_gauges(source):
+    """Add a callable returning [(name, help, [(labels, value)])] sampled on each scrape."""
+    _gauge_sources.append(source)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_metrics():
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value:g}")
+
+    with _metrics_lock:
+        route_items = [(key, dict(values)) for key, values in _route_metrics.items()]
+        llm_items = [(key, dict(values)) for key, values in _llm_metrics.items()]
+
+    def route_samples(field):
+        return [
+            ({"route": route, "method": method, "status": status}, values.get(field, 0))
+            for (route, method, status), values in route_items
+        ]
+
+    def llm_samples(field):
+        return [
+            ({"route": route, "extractor": extractor}, values.get(field, 0))
+            for (route, extractor), values in llm_items
+        ]
+
+    metric("moneytalks_http_requests_total", "counter", "Handled requests.", route_samples("requests"))
+    metric("moneytalks_http_request_duration_seconds_total", "counter", "Total request handling time.", route_samples("duration_seconds"))
+    metric("moneytalks_db_statements_total", "counter", "SQL statements executed.", route_samples("db_count"))
+    metric("moneytalks_db_duration_seconds_total", "counter", "Time spent executing SQL.", route_samples("db_seconds"))
+    metric("moneytalks_llm_calls_total", "counter", "LLM calls per extractor.", llm_samples("calls"))
+    metric("moneytalks_llm_duration_seconds_total", "counter", "Time spent waiting on LLM calls per extractor.", llm_samples("duration_seconds"))
+    metric("moneytalks_image_processing_seconds_total", "counter", "Time spent decoding and re-encoding images.", route_samples("image_seconds"))
+    metric("moneytalks_serialization_seconds_total", "counter", "Time spent encoding JSON responses.", route_samples("serialize_seconds"))
+
+    for source in _gauge_sources:
+        for name, help_text, samples in source():
+            metric(name, "gauge", help_text, samples)
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    from services import admin_token_verify
+
+    try:
+        admin_token_verify(request.headers)
+    except ForbiddenError as e:
+        return jsonify({"error": str(e)}), 403
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def init_instrumentation(app):
+    import services
+
+    for name in LLM_FUNCTION_NAMES:
+        setattr(services, name, instrument_llm(name, getattr(services, name)))
+    for name in LLM_ASYNC_FUNCTION_NAMES:
+        setattr(services, name, instrument_llm_async(name.removesuffix("_async"), getattr(services, name)))
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    dumps = app.json.dumps
+
+    @functools.wraps(dumps)
+    def timed_dumps(obj, **kwargs):
+        with timed("serialize"):
+            return dumps(obj, **kwargs)
+
+    app.json.dumps = timed_dumps
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
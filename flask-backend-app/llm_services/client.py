@@ -0,0 +1,57 @@
+import os
+
+from custom_exception import LlmServiceError
+
+MODEL_NAME = os.getenv("MODEL_NAME")
+API_BASE_URL = os.getenv("API_BASE_URL")
+API_KEY = os.getenv("API_KEY")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+
+# One client per process so HTTP connections to the LLM are pooled and reused.
+# Both are created lazily: gunicorn forks after import, and the async client
+# must be created on the event loop that serves the requests.
+_client = None
+_async_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY, timeout=LLM_TIMEOUT_SECONDS)
+    return _client
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(base_url=API_BASE_URL, api_key=API_KEY, timeout=LLM_TIMEOUT_SECONDS)
+    return _async_client
+
+
+def _parse_kwargs(messages, response_format, temperature):
+    kwargs = {"model": MODEL_NAME, "messages": messages, "response_format": response_format}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return kwargs
+
+
+def parse_completion(messages, response_format, temperature=None):
+    try:
+        completion = get_client().beta.chat.completions.parse(
+            **_parse_kwargs(messages, response_format, temperature)
+        )
+        return completion.choices[0].message.parsed
+    except Exception as e:
+        raise LlmServiceError(f"Error in LLM service: {str(e)}")
+
+
+async def parse_completion_async(messages, response_format, temperature=None):
+    try:
+        completion = await get_async_client().beta.chat.completions.parse(
+            **_parse_kwargs(messages, response_format, temperature)
+        )
+        return completion.choices[0].message.parsed
+    except Exception as e:
+        raise LlmServiceError(f"Error in LLM service: {str(e)}")
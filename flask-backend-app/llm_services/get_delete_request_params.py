@@ -1,14 +1,9 @@
 from typing import Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field
 from datetime import datetime
-import os
 
-from custom_exception import LlmServiceError
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
+from llm_services.client import parse_completion, parse_completion_async
+from llm_services.prompts import context_message
 
 class DeleteInfo(BaseModel):
     """Thông tin chi tiết về yêu cầu xóa khoản thu chi"""
@@ -16,7 +11,7 @@ class DeleteInfo(BaseModel):
     start_date: Optional[str] = Field(default=None)
     end_date: Optional[str] = Field(default=None)
 
-def extract_delete_req(user_input: str) -> DeleteInfo:
+def delete_req_messages(user_input: str, context: Optional[str] = None) -> list:
     now = datetime.now()
 
     system_message = {
@@ -53,17 +48,11 @@ def extract_delete_req(user_input: str) -> DeleteInfo:
         }
         """
     }
+    context_messages = [context_message(context)] if context else []
+    return [system_message, *context_messages, {"role": "user", "content": user_input + f",bây giờ là {now.strftime('%Y-%m-%d')})"}]
 
-    try:
-        message = [system_message, {"role": "user", "content": user_input + f",bây giờ là {now.strftime('%Y-%m-%d')})"}]
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
+def extract_delete_req(user_input: str, context: Optional[str] = None) -> DeleteInfo:
+    return parse_completion(delete_req_messages(user_input, context), DeleteInfo)
 
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=message,
-            response_format=DeleteInfo,
-        )
-        return completion.choices[0].message.parsed
-        
-    except Exception as e: 
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
\ No newline at end of file
+async def extract_delete_req_async(user_input: str, context: Optional[str] = None) -> DeleteInfo:
+    return await parse_completion_async(delete_req_messages(user_input, context), DeleteInfo)
@@ -1,14 +1,8 @@
 from typing import Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field
 from datetime import datetime
-import os
 
-from custom_exception import LlmServiceError
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
+from llm_services.client import parse_completion, parse_completion_async
 
 class Expense(BaseModel):
     """Thông tin chi tiết về một khoản thu chi"""
@@ -20,7 +14,7 @@ class NewExpenses(BaseModel):
     """Thông tin chi tiết về yêu cầu thêm khoản thu chi mới"""
     expenses : list[Expense] = Field(default=None)
 
-def extract_insert_req(user_input: str) -> NewExpenses:
+def insert_req_messages(user_input: str) -> list:
     now = datetime.now()
 
     system_message = {
@@ -46,18 +40,10 @@ def extract_insert_req(user_input: str) -> NewExpenses:
         Nếu chỉ có một khoản thu chi, bạn vẫn trả về danh sách chứa một phần tử.
         """
     }
+    return [system_message, {"role": "user", "content": user_input + f",hôm nay là {now.strftime('%Y-%m-%d')})"}]
+
+def extract_insert_req(user_input: str) -> NewExpenses:
+    return parse_completion(insert_req_messages(user_input), NewExpenses, temperature=0)
 
-    try:
-        message = [system_message, {"role": "user", "content": user_input + f",hôm nay là {now.strftime('%Y-%m-%d')})"}]
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
-
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=message,
-            response_format=NewExpenses,
-            temperature=0
-        )
-        return completion.choices[0].message.parsed
-        
-    except Exception as e: 
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
+async def extract_insert_req_async(user_input: str) -> NewExpenses:
+    return await parse_completion_async(insert_req_messages(user_input), NewExpenses, temperature=0)
@@ -1,15 +1,9 @@
 from typing import Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-import os
 import base64
 
-from custom_exception import LlmServiceError
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
+from llm_services.client import parse_completion, parse_completion_async
 
 class Expense(BaseModel):
     description: Optional[str] = None
@@ -30,7 +24,7 @@ def encode_image_to_base64(image_path: str) -> str:
     with open(image_path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
-def extract_insert_req_from_local_image(image_path: str) -> ResponseModel:
+def image_req_messages(image_path: str) -> list:
     now = datetime.now()
     image_base64 = encode_image_to_base64(image_path)
 
@@ -62,18 +56,10 @@ def extract_insert_req_from_local_image(image_path: str) -> ResponseModel:
             {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
         ]
     }
+    return [system_message, user_message]
 
-    try:
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
-
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=[system_message, user_message],
-            response_format=ResponseModel,
-            temperature=0
-        )
-
-        return completion.choices[0].message.parsed
+def extract_insert_req_from_local_image(image_path: str) -> ResponseModel:
+    return parse_completion(image_req_messages(image_path), ResponseModel, temperature=0)
 
-    except Exception as e:
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
+async def extract_insert_req_from_local_image_async(image_path: str) -> ResponseModel:
+    return await parse_completion_async(image_req_messages(image_path), ResponseModel, temperature=0)
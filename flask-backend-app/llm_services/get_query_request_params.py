@@ -1,14 +1,8 @@
 from typing import Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field
 from datetime import datetime
-import os
 
-from custom_exception import LlmServiceError
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
+from llm_services.client import parse_completion, parse_completion_async
 
 class Query(BaseModel):
     """Thông tin chi tiết về một truy vấn tài chính"""
@@ -18,7 +12,7 @@ class Query(BaseModel):
     max_amount: Optional[int] = Field(default=None)
     key_words: list[str] = Field(default=None)
 
-def extract_query_req(user_input: str) -> Query:
+def query_req_messages(user_input: str) -> list:
     now = datetime.now()
 
     system_message = {
@@ -68,19 +62,10 @@ def extract_query_req(user_input: str) -> Query:
             4. **Xử lý Null**: Nếu không xác định được thông tin nào, trả về null hoặc [] tương ứng.
         """
     }
+    return [system_message, {"role": "user", "content": user_input + f",bây giờ là {now.strftime('%Y-%m-%d')})"}]
 
-    try:
-        message = [system_message, {"role": "user", "content": user_input + f",bây giờ là {now.strftime('%Y-%m-%d')})"}]
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
-
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=message,
-            response_format=Query,
-            temperature=0
-        )
+def extract_query_req(user_input: str) -> Query:
+    return parse_completion(query_req_messages(user_input), Query, temperature=0)
 
-        return completion.choices[0].message.parsed
-    
-    except Exception as e: 
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
+async def extract_query_req_async(user_input: str) -> Query:
+    return await parse_completion_async(query_req_messages(user_input), Query, temperature=0)
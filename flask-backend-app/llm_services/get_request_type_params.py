@@ -1,19 +1,13 @@
 from typing import Literal
-from openai import OpenAI
-from custom_exception import LlmServiceError
+from llm_services.client import parse_completion, parse_completion_async
 from pydantic import BaseModel, Field
-import os
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
 
 class DatabaseRequestType(BaseModel):
     request_type: Literal["insert_expenses", "query_expenses", "update_expenses","delete_expenses", "other"] = Field(
         description="Loại yêu cầu đến cơ sở dữ liệu"
     )
 
-def extract_request_type(user_input: str) -> DatabaseRequestType:
+def request_type_messages(user_input: str) -> list:
     system_message = {
         "role": "system",
         "content": """
@@ -30,23 +24,10 @@ def extract_request_type(user_input: str) -> DatabaseRequestType:
             {"request_type": Nhóm được phân loại} (ví dụ: {"request_type": "insert_expenses"}).
             """
     }
+    return [system_message, {"role": "user", "content": user_input }]
 
-    try:
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
-
-        message = [system_message, {"role": "user", "content": user_input }]
-
-
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=message,
-            response_format=DatabaseRequestType,
-            temperature=0
-        )
-
-        return completion.choices[0].message.parsed
-    except Exception as e: 
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
-
+def extract_request_type(user_input: str) -> DatabaseRequestType:
+    return parse_completion(request_type_messages(user_input), DatabaseRequestType, temperature=0)
 
-    
\ No newline at end of file
+async def extract_request_type_async(user_input: str) -> DatabaseRequestType:
+    return await parse_completion_async(request_type_messages(user_input), DatabaseRequestType, temperature=0)
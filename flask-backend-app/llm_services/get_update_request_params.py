@@ -1,13 +1,8 @@
 from typing import Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field
-import os
 
-from custom_exception import LlmServiceError
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
+from llm_services.client import parse_completion, parse_completion_async
+from llm_services.prompts import context_message
 
 
 class UpdateInfo(BaseModel):
@@ -17,7 +12,7 @@ class UpdateInfo(BaseModel):
     updated_amount: Optional[int] = Field(default=None)
     updated_date: Optional[str] = Field(default=None)
 
-def extract_update_req(user_input: str) -> UpdateInfo:
+def update_req_messages(user_input: str, context: Optional[str] = None) -> list:
 
     system_message = {
         "role": "system",
@@ -55,17 +50,11 @@ def extract_update_req(user_input: str) -> UpdateInfo:
         }
         """
     }
+    context_messages = [context_message(context)] if context else []
+    return [system_message, *context_messages, {"role": "user", "content": user_input }]
 
-    try:
-        message = [system_message, {"role": "user", "content": user_input }]
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
+def extract_update_req(user_input: str, context: Optional[str] = None) -> UpdateInfo:
+    return parse_completion(update_req_messages(user_input, context), UpdateInfo)
 
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=message,
-            response_format=UpdateInfo,
-        )
-        return completion.choices[0].message.parsed
-        
-    except Exception as e: 
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
+async def extract_update_req_async(user_input: str, context: Optional[str] = None) -> UpdateInfo:
+    return await parse_completion_async(update_req_messages(user_input, context), UpdateInfo)
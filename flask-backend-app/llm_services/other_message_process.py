@@ -1,20 +1,14 @@
 from typing import Optional
-from openai import OpenAI
 from pydantic import BaseModel, Field
 from datetime import datetime
-import os
 
-from custom_exception import LlmServiceError
-
-MODEL_NAME = os.getenv("MODEL_NAME")
-API_BASE_URL = os.getenv("API_BASE_URL")
-API_KEY = os.getenv("API_KEY")
+from llm_services.client import parse_completion, parse_completion_async
 
 class Response(BaseModel):
     """Thông tin phản hồi chung từ LLM"""
     response: Optional[str] = Field(default=None)
 
-def other_message_process(user_input: str) -> Response:
+def other_message_messages(user_input: str) -> list:
     now = datetime.now()
 
     system_message = {
@@ -24,19 +18,10 @@ def other_message_process(user_input: str) -> Response:
             Nhiệm vụ của bạn là đọc yêu cầu từ người dùng, trả lời một cách ngắn gọn, đầy đủ về thông tin không liên quan ấy.
         """
     }
+    return [system_message, {"role": "user", "content": user_input + f",bây giờ là {now.strftime('%Y-%m-%d')})"}]
 
-    try:
-        message = [system_message, {"role": "user", "content": user_input + f",bây giờ là {now.strftime('%Y-%m-%d')})"}]
-        client = OpenAI(base_url=API_BASE_URL, api_key=API_KEY)
-
-        completion = client.beta.chat.completions.parse(
-            model=MODEL_NAME,
-            messages=message,
-            response_format=Response,
-            temperature=0.5
-        )
+def other_message_process(user_input: str) -> Response:
+    return parse_completion(other_message_messages(user_input), Response, temperature=0.5)
 
-        return completion.choices[0].message.parsed
-    
-    except Exception as e: 
-        raise LlmServiceError(f"Error in LLM service: {str(e)}")
+async def other_message_process_async(user_input: str) -> Response:
+    return await parse_completion_async(other_message_messages(user_input), Response, temperature=0.5)
@@ -0,0 +1,8 @@
+def context_message(context):
+    """System message carrying the conversation context from conversation_context.py."""
+    return {
+        "role": "system",
+        "content": "Ngữ cảnh hội thoại gần đây. Chỉ dùng để hiểu các tham chiếu như \"khoản vừa thêm\", "
+                   "\"khoản đó\", \"mấy khoản lúc nãy\"; yêu cầu cần xử lý luôn là tin nhắn cuối cùng của người dùng.\n\n"
+                   + context
+    }
@@ -0,0 +1,41 @@
+import functools
+import importlib
+
+# Extractor name -> module defining it. The modules pull in openai and pydantic,
+# so they are only imported when an extractor is first called.
+EXTRACTOR_MODULES = {
+    "extract_request_type": "llm_services.get_request_type_params",
+    "extract_insert_req": "llm_services.get_insert_request_params",
+    "extract_query_req": "llm_services.get_query_request_params",
+    "extract_update_req": "llm_services.get_update_request_params",
+    "extract_delete_req": "llm_services.get_delete_request_params",
+    "other_message_process": "llm_services.other_message_process",
+    "extract_insert_req_from_local_image": "llm_services.get_insert_request_params_img",
+}
+
+
+@functools.cache
+def load_extractor(name):
+    """Import and return an extractor, `<name>_async` gives its async variant."""
+    base_name = name.removesuffix("_async")
+    module = importlib.import_module(EXTRACTOR_MODULES[base_name])
+    return getattr(module, name)
+
+
+def lazy_extractor(name):
+    """A stand-in for an extractor that imports the real one on first call."""
+    if name.endswith("_async"):
+        async def extractor(*args, **kwargs):
+            return await load_extractor(name)(*args, **kwargs)
+    else:
+        def extractor(*args, **kwargs):
+            return load_extractor(name)(*args, **kwargs)
+
+    extractor.__name__ = extractor.__qualname__ = name
+    return extractor
+
+
+def preload(extra_modules=()):
+    """Import every extractor now, for servers that fork workers after loading the app."""
+    for module_name in {*EXTRACTOR_MODULES.values(), "openai", *extra_modules}:
+        importlib.import_module(module_name)
@@ -0,0 +1,170 @@
+import json
+import os
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, or_, select
+
+from models import db, Message, MessageArchiveSegment
+
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", 180))
+MESSAGE_ARCHIVE_SEGMENT_SIZE = int(os.getenv("MESSAGE_ARCHIVE_SEGMENT_SIZE", 200))
+
+message_table = Message.__table__
+segment_table = MessageArchiveSegment.__table__
+
+# Same attributes as a message_table row, so serialize_message works on both.
+ArchivedMessage = namedtuple("ArchivedMessage", "id user_id role content timestamp")
+
+def compress_messages(rows):
+    payload = [
+        [row.id, row.role, row.content, row.timestamp.isoformat() if row.timestamp else None]
+        for row in rows
+    ]
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+def decompress_messages(user_id, payload):
+    return [
+        ArchivedMessage(message_id, user_id, role, content, datetime.fromisoformat(timestamp) if timestamp else None)
+        for message_id, role, content, timestamp in json.loads(zlib.decompress(payload))
+    ]
+
+def load_archived_page(user_id, before_id, count):
+    """Return up to `count` archived messages with id < before_id, newest first.
+
+    Archived ids are always lower than every id still in the message table, so
+    this continues a cursor page where the hot table ran out.
+    """
+    # yield_per as an execution option opens a server-side cursor, so only the
+    # segments this page reads are fetched; deletes can leave segments short,
+    # which rules out a fixed LIMIT.
+    statement = (
+        select(segment_table.c.payload)
+        .where(segment_table.c.user_id == user_id)
+        .order_by(segment_table.c.last_message_id.desc())
+        .execution_options(yield_per=4)
+    )
+    if before_id:
+        statement = statement.where(segment_table.c.first_message_id < before_id)
+
+    messages = []
+    result = db.session.execute(statement)
+    try:
+        for (payload,) in result:
+            for message in reversed(decompress_messages(user_id, payload)):
+                if before_id and message.id >= before_id:
+                    continue
+                messages.append(message)
+                if len(messages) >= count:
+                    return messages
+    finally:
+        result.close()
+    return messages
+
+def _segments_containing(user_id, message_ids):
+    conditions = [
+        (segment_table.c.first_message_id <= message_id) & (segment_table.c.last_message_id >= message_id)
+        for message_id in message_ids
+    ]
+    return db.session.execute(
+        select(segment_table.c.id, segment_table.c.payload)
+        .where(segment_table.c.user_id == user_id, or_(*conditions))
+    ).all()
+
+def load_archived_messages(user_id, message_ids):
+    if not message_ids:
+        return []
+    wanted = set(message_ids)
+    return [
+        message
+        for segment in _segments_containing(user_id, message_ids)
+        for message in decompress_messages(user_id, segment.payload)
+        if message.id in wanted
+    ]
+
+def delete_archived_message(user_id, message_id):
+    """Remove one message from its segment in the caller's transaction, returns it or None."""
+    for segment in _segments_containing(user_id, [message_id]):
+        messages = decompress_messages(user_id, segment.payload)
+        removed = next((message for message in messages if message.id == message_id), None)
+        if not removed:
+            continue
+
+        remaining = [message for message in messages if message.id != message_id]
+        if remaining:
+            db.session.execute(
+                segment_table.update().where(segment_table.c.id == segment.id).values(
+                    first_message_id=remaining[0].id,
+                    last_message_id=remaining[-1].id,
+                    message_count=len(remaining),
+                    payload=compress_messages(remaining),
+                )
+            )
+        else:
+            db.session.execute(segment_table.delete().where(segment_table.c.id == segment.id))
+        return removed
+    return None
+
+def delete_all_archived_messages(user_id):
+    deleted_counts = db.session.execute(
+        segment_table.delete().where(segment_table.c.user_id == user_id).returning(segment_table.c.message_count)
+    ).scalars().all()
+    return sum(deleted_counts)
+
+def archive_user_messages(user_id, cutoff, segment_size=MESSAGE_ARCHIVE_SEGMENT_SIZE):
+    # Archive a prefix of the user's history: everything up to the newest message
+    # older than the cutoff, so archived ids stay below all hot ids.
+    boundary_id = db.session.execute(
+        select(func.max(message_table.c.id))
+        .where(message_table.c.user_id == user_id, message_table.c.timestamp < cutoff)
+    ).scalar()
+    if boundary_id is None:
+        return 0
+
+    archived = 0
+    while True:
+        rows = db.session.execute(
+            select(message_table.c.id, message_table.c.role, message_table.c.content, message_table.c.timestamp)
+            .where(message_table.c.user_id == user_id, message_table.c.id <= boundary_id)
+            .order_by(message_table.c.id)
+            .limit(segment_size)
+        ).all()
+        if not rows:
+            return archived
+
+        db.session.execute(insert(MessageArchiveSegment).values(
+            user_id=user_id,
+            first_message_id=rows[0].id,
+            last_message_id=rows[-1].id,
+            message_count=len(rows),
+            payload=compress_messages(rows),
+            created_at=datetime.now(timezone.utc),
+        ))
+        db.session.execute(
+            message_table.delete().where(message_table.c.id.in_([row.id for row in rows]))
+        )
+        db.session.commit()
+        archived += len(rows)
+
+def archive_messages(older_than_days=MESSAGE_ARCHIVE_AFTER_DAYS, segment_size=MESSAGE_ARCHIVE_SEGMENT_SIZE):
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    user_ids = db.session.execute(
+        select(message_table.c.user_id).where(message_table.c.timestamp < cutoff).distinct()
+    ).scalars().all()
+
+    archived = 0
+    for user_id in user_ids:
+        archived += archive_user_messages(user_id, cutoff, segment_size)
+    return len(user_ids), archived
+
+@click.command("archive-messages")
+@click.option("--older-than-days", default=MESSAGE_ARCHIVE_AFTER_DAYS, show_default=True)
+@click.option("--segment-size", default=MESSAGE_ARCHIVE_SEGMENT_SIZE, show_default=True)
+@with_appcontext
+def archive_messages_command(older_than_days, segment_size):
+    """Move old messages into compressed per-user archive segments."""
+    users, archived = archive_messages(older_than_days, segment_size)
+    click.echo(f"Archived {archived} messages for {users} users")
@@ -0,0 +1,168 @@
+import re
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, not_, select
+
+from models import db, Message
+
+# Version 2 stores assistant prompts as template ids and uses short envelope keys:
+#   v: version, t: kind (u user text, m assistant text, c confirmation, i image),
+#   r: request_type, tpl/p: template id and params, x: literal text or url,
+#   d: confirmation data, e: extra keys merged into the rendered payload.
+# render_content() turns it back into the response shape the app has always used.
+CONTENT_VERSION = 2
+
+TEMPLATES = {
+    "insert_confirm": "Các khoản dưới đây đã được ghi nhận, bạn có muốn thêm không?",
+    "query_confirm": "Bạn đang muốn tìm kiếm các khoản thu chi theo các tiêu chí dưới đây, bạn có muốn tìm không?",
+    "update_confirm": "Khoản thu chi dưới đây sẽ được sửa với các tham số dưới đây, bạn có chắc không?",
+    "update_not_found": "Không tìm thấy khoản thu chi có ID này, hãy kiểm tra lại.",
+    "delete_confirm": "Tìm thấy {count} khoản chi. Bạn có chắc chắn muốn xóa chúng không?",
+    "delete_missing_criteria": "Bạn cần cung cấp (danh sách ID) hoặc (khoảng ngày) để xóa.",
+    "delete_not_found": "Không tìm thấy khoản chi nào khớp với tiêu chí của bạn.",
+    "invalid_image": "Hình ảnh không hợp lệ, vui lòng thử lại với hình ảnh khác.",
+}
+
+_TEMPLATE_IDS = {text: template for template, text in TEMPLATES.items() if "{" not in text}
+_DELETE_CONFIRM_PATTERN = re.compile(r"^Tìm thấy (\d+) khoản chi\. Bạn có chắc chắn muốn xóa chúng không\?$")
+
+def user_text_content(text):
+    return {"v": CONTENT_VERSION, "t": "u", "x": text}
+
+def image_content(url, extra=None):
+    content = {"v": CONTENT_VERSION, "t": "i", "x": url}
+    if extra:
+        content["e"] = extra
+    return content
+
+def assistant_text_content(text=None, template=None, request_type=None, params=None):
+    content = {"v": CONTENT_VERSION, "t": "m"}
+    if request_type:
+        content["r"] = request_type
+    _set_text(content, text, template, params)
+    return content
+
+def confirmation_content(request_type, data, text=None, template=None, params=None, extra=None):
+    content = {"v": CONTENT_VERSION, "t": "c", "r": request_type, "d": data}
+    _set_text(content, text, template, params)
+    if extra:
+        content["e"] = extra
+    return content
+
+def _set_text(content, text, template, params):
+    if template:
+        content["tpl"] = template
+        if params:
+            content["p"] = params
+    else:
+        content["x"] = text
+
+def content_text(content):
+    if "tpl" in content:
+        return TEMPLATES[content["tpl"]].format(**content.get("p", {}))
+    return content.get("x")
+
+def render_content(content):
+    if not isinstance(content, dict) or content.get("v") != CONTENT_VERSION:
+        return content
+
+    kind = content["t"]
+    if kind == "u":
+        return {"type": "message", "message": content["x"]}
+    if kind == "i":
+        return {"type": "image_url", "data": content["x"], **content.get("e", {})}
+    if kind == "c":
+        return {
+            "type": "comfirmation_request",
+            "request_type": content["r"],
+            "data": {"message": content_text(content), "data": content.get("d"), **content.get("e", {})}
+        }
+
+    rendered = {"type": "message"}
+    if "r" in content:
+        rendered["request_type"] = content["r"]
+    rendered["data"] = {"message": content_text(content)}
+    return rendered
+
+def _template_for(text):
+    template = _TEMPLATE_IDS.get(text)
+    if template:
+        return template, None
+    match = _DELETE_CONFIRM_PATTERN.match(text or "")
+    if match:
+        return "delete_confirm", {"count": int(match.group(1))}
+    return None, None
+
+def compact_content(content):
+    """Convert a legacy content dict to version 2, unknown shapes are returned unchanged."""
+    if not isinstance(content, dict) or content.get("v") == CONTENT_VERSION:
+        return content
+
+    content_type = content.get("type")
+    if content_type == "image_url" and isinstance(content.get("data"), str):
+        extra = {key: value for key, value in content.items() if key not in ("type", "data")}
+        return image_content(content["data"], extra or None)
+
+    if content_type == "message" and "data" not in content and set(content) == {"type", "message"}:
+        return user_text_content(content["message"])
+
+    data = content.get("data")
+    if not isinstance(data, dict) or "message" not in data:
+        return content
+    template, params = _template_for(data["message"])
+    text = None if template else data["message"]
+
+    if content_type == "message" and set(data) == {"message"} and set(content) <= {"type", "request_type", "data"}:
+        return assistant_text_content(text, template, content.get("request_type"), params)
+
+    if content_type == "comfirmation_request" and "request_type" in content and set(content) == {"type", "request_type", "data"}:
+        extra = {key: value for key, value in data.items() if key not in ("message", "data")}
+        return confirmation_content(content["request_type"], data.get("data"), text, template, params, extra or None)
+
+    return content
+
+def migrate_message_contents(batch_size=1000, pause_seconds=0.0):
+    message_table = Message.__table__
+    last_id = 0
+    migrated = 0
+
+    update_statement = (
+        message_table.update()
+        .where(message_table.c.id == bindparam("message_id"))
+        .values(content=bindparam("new_content"))
+    )
+
+    while True:
+        rows = db.session.execute(
+            select(message_table.c.id, message_table.c.content)
+            .where(message_table.c.id > last_id, not_(message_table.c.content.has_key("v")))
+            .order_by(message_table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return migrated
+        last_id = rows[-1].id
+
+        updates = []
+        for row in rows:
+            compacted = compact_content(row.content)
+            if compacted is not row.content:
+                updates.append({"message_id": row.id, "new_content": compacted})
+        if updates:
+            db.session.execute(update_statement, updates)
+        db.session.commit()
+        migrated += len(updates)
+
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+@click.command("migrate-message-content")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--pause", "pause_seconds", default=0.0, show_default=True, help="Seconds to sleep between batches.")
+@with_appcontext
+def migrate_message_content_command(batch_size, pause_seconds):
+    """Rewrite legacy Message.content rows into the compact version 2 format."""
+    migrated = migrate_message_contents(batch_size, pause_seconds)
+    click.echo(f"Migrated {migrated} messages")
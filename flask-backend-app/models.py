@@ -2,8 +2,11 @@ from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from database import RoutingSession
+import click
+from flask.cli import with_appcontext
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -19,13 +22,63 @@ class Message(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     role = db.Column(db.String(10), nullable=False)  
     content = db.Column(JSONB, nullable=False)  
-    timestamp = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (db.Index("ix_message_user_id_id", "user_id", "id"),)
 
 class UserExpense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    # Whole đồng, see money.py.
+    amount = db.Column(db.BigInteger, nullable=False)
     description = db.Column(db.String(255), nullable=False)
     expense_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+
+    __table_args__ = (db.Index("ix_user_expense_user_id_expense_date", "user_id", "expense_date"),)
+
+class ChangeLog(db.Model):
+    id = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    entity = db.Column(db.String(10), nullable=False)
+    entity_id = db.Column(db.Integer)
+    op = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (db.Index("ix_change_log_user_id_id", "user_id", "id"),)
+
+class ConversationHistory(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    # One shortened line per message older than the recent window, oldest
+    # first, see conversation_context.py.
+    lines = db.Column(db.Text, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class ExpenseSelection(db.Model):
+    token = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    criteria = db.Column(JSONB, nullable=False)
+    max_expense_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class MessageArchiveSegment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (db.Index("ix_message_archive_segment_user_id_last_message_id", "user_id", "last_message_id"),)
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Create missing tables. Run once per deploy instead of on every import."""
+    db.create_all()
+    click.echo("Database tables are up to date")
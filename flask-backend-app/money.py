@@ -0,0 +1,69 @@
+import math
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from models import db
+
+# VND has no minor unit in practice, amounts are stored as whole đồng in a BIGINT.
+# Chart units only exist at the edge: totals stay integers until scale_amount().
+UNIT_DIVISORS = {
+    "": 1,
+    "k": 1_000,
+    "tr": 1_000_000,
+}
+
+
+def to_amount(value):
+    """Normalize an amount from JSON, a query string or an extractor to whole đồng."""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, Decimal):
+        return int(value.to_integral_value(rounding=ROUND_HALF_EVEN))
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid amount: {value!r}")
+        return int(round(value))
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+        try:
+            return to_amount(float(value))
+        except ValueError:
+            raise ValueError(f"Invalid amount: {value!r}")
+    raise ValueError(f"Invalid amount: {value!r}")
+
+
+def scale_amount(amount, unit):
+    """The one place where integer amounts become display numbers in `unit`."""
+    return amount / UNIT_DIVISORS[unit]
+
+
+@click.command("migrate-amounts")
+@with_appcontext
+def migrate_amounts_command():
+    """Convert user_expense.amount from double precision to BIGINT whole đồng.
+
+    The ALTER rewrites the table under an exclusive lock, run it in a
+    maintenance window on large tables.
+    """
+    data_type = db.session.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_name = 'user_expense' AND column_name = 'amount'"
+    )).scalar()
+    if data_type == "bigint":
+        click.echo("user_expense.amount is already BIGINT")
+        return
+
+    fractional = db.session.execute(
+        text("SELECT count(*) FROM user_expense WHERE amount <> round(amount)")
+    ).scalar()
+    db.session.execute(text("ALTER TABLE user_expense ALTER COLUMN amount TYPE BIGINT USING round(amount)::bigint"))
+    db.session.commit()
+    click.echo(f"user_expense.amount is now BIGINT, {fractional} fractional amounts were rounded")
@@ -0,0 +1,246 @@
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+import click
+from dateutil.relativedelta import relativedelta
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, text
+
+from models import db
+from read_path import expense_table, select_expenses, expense_filter_conditions, amount_total
+
+# Optional range partitioning of user_expense by expense_date. A fresh
+# `flask init-db` still creates a plain table; `flask partition-expenses migrate`
+# converts it, `maintain` (run daily from cron) keeps partitions ahead of time.
+PARTITION_INTERVAL = os.getenv("EXPENSE_PARTITION_INTERVAL", "month")
+PARTITIONS_AHEAD = int(os.getenv("EXPENSE_PARTITIONS_AHEAD", 3))
+
+PARENT_TABLE = "user_expense"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+UNPARTITIONED_TABLE = f"{PARENT_TABLE}_unpartitioned"
+INTERVALS = {
+    "month": (relativedelta(months=1), "%Y_%m"),
+    "year": (relativedelta(years=1), "%Y"),
+}
+
+
+def period_start(day, interval):
+    return date(day.year, day.month, 1) if interval == "month" else date(day.year, 1, 1)
+
+
+def partition_for(start, interval):
+    """(name, start, end) of the partition holding the period that begins at `start`."""
+    step, suffix = INTERVALS[interval]
+    return f"{PARENT_TABLE}_p{start.strftime(suffix)}", start, start + step
+
+
+def upcoming_periods(interval, ahead):
+    step, _ = INTERVALS[interval]
+    start = period_start(datetime.now(timezone.utc).date(), interval)
+    return [start + step * n for n in range(ahead + 1)]
+
+
+def periods_with_rows(table, interval):
+    """Period starts that have rows in `table`; stray dates get their own partition, not a run of empty ones."""
+    return db.session.execute(
+        text(f"SELECT DISTINCT date_trunc('{interval}', expense_date)::date FROM {table}")
+    ).scalars().all()
+
+
+def is_partitioned():
+    return db.session.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": PARENT_TABLE}
+    ).scalar() or False
+
+
+def existing_partitions():
+    return set(db.session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:table)"
+    ), {"table": PARENT_TABLE}).scalars())
+
+
+def create_partition(name, start, end):
+    """Create one range partition, moving rows that already landed in the default partition."""
+    range_condition = "expense_date >= :start AND expense_date < :end"
+    bounds = {"start": start, "end": end}
+    moved = db.session.execute(
+        text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE {range_condition}"), bounds
+    ).scalar()
+
+    if moved:
+        db.session.execute(text(
+            f"CREATE TEMP TABLE partition_moved ON COMMIT DROP AS "
+            f"WITH deleted AS (DELETE FROM {DEFAULT_PARTITION} WHERE {range_condition} RETURNING *) "
+            f"SELECT * FROM deleted"
+        ), bounds)
+    db.session.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    if moved:
+        db.session.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM partition_moved"))
+        db.session.execute(text("DROP TABLE partition_moved"))
+    return moved
+
+
+def ensure_partitions(period_starts, interval=PARTITION_INTERVAL):
+    """Create the missing partitions for the given period starts, returns the names created."""
+    present = existing_partitions()
+    created = []
+    for start in sorted(set(period_starts)):
+        name, start, end = partition_for(start, interval)
+        if name not in present:
+            create_partition(name, start, end)
+            created.append(name)
+    return created
+
+
+def maintain_partitions(interval=PARTITION_INTERVAL, ahead=PARTITIONS_AHEAD):
+    """Keep `ahead` future periods ready and give rows stuck in the default partition a home."""
+    created = ensure_partitions(
+        upcoming_periods(interval, ahead) + periods_with_rows(DEFAULT_PARTITION, interval), interval
+    )
+    db.session.commit()
+    return created
+
+
+def migrate_to_partitioned(interval=PARTITION_INTERVAL, ahead=PARTITIONS_AHEAD, drop_old=False):
+    """Swap user_expense for a partitioned copy in one transaction.
+
+    The old heap is renamed to user_expense_unpartitioned and kept unless
+    `drop_old` is set. Writers are blocked while rows are copied.
+    """
+    def execute(statement):
+        return db.session.execute(text(statement))
+
+    execute(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE")
+    execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {UNPARTITIONED_TABLE}")
+    execute(f"ALTER TABLE {UNPARTITIONED_TABLE} RENAME CONSTRAINT {PARENT_TABLE}_pkey TO {UNPARTITIONED_TABLE}_pkey")
+    execute(
+        "ALTER INDEX IF EXISTS ix_user_expense_user_id_expense_date "
+        "RENAME TO ix_user_expense_unpartitioned_user_id_expense_date"
+    )
+    execute(
+        f"CREATE TABLE {PARENT_TABLE} (LIKE {UNPARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (expense_date)"
+    )
+    # The partition key has to be part of the primary key; ids stay unique through the shared sequence.
+    execute(f"ALTER TABLE {PARENT_TABLE} ADD PRIMARY KEY (id, expense_date)")
+    execute(f'ALTER TABLE {PARENT_TABLE} ADD FOREIGN KEY (user_id) REFERENCES "user" (id)')
+    execute(f"ALTER SEQUENCE {PARENT_TABLE}_id_seq OWNED BY {PARENT_TABLE}.id")
+    execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT")
+
+    ensure_partitions(upcoming_periods(interval, ahead) + periods_with_rows(UNPARTITIONED_TABLE, interval), interval)
+
+    # Indexes on the parent cascade to every partition, present and future.
+    execute(f"CREATE INDEX ix_user_expense_user_id_expense_date ON {PARENT_TABLE} (user_id, expense_date)")
+
+    copied = execute(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {UNPARTITIONED_TABLE}").rowcount
+    if drop_old:
+        execute(f"DROP TABLE {UNPARTITIONED_TABLE}")
+    db.session.commit()
+    return copied
+
+
+def _scanned_relations(plan):
+    scanned, removed = [], 0
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node.get("Relation Name", "").startswith(f"{PARENT_TABLE}_"):
+            scanned.append(node["Relation Name"])
+        removed += node.get("Subplans Removed", 0)
+        stack.extend(node.get("Plans", []))
+    return sorted(set(scanned)), removed
+
+
+def pruning_report(user_id):
+    """EXPLAIN the partition-sensitive reads and list the partitions each one touches."""
+    from services import get_date_range
+
+    today = datetime.now(timezone.utc).date()
+    statements = {
+        "expenses page, last 30 days": (
+            select_expenses(func.count().over().label("total_records"))
+            .where(*expense_filter_conditions(user_id, {
+                "start_date": (today - timedelta(days=29)).isoformat(),
+                "end_date": today.isoformat(),
+            }))
+            .order_by(expense_table.c.expense_date.desc())
+            .limit(20)
+        ),
+    }
+    for range_name in ("today", "7d", "30d", "1y"):
+        start_date, end_date = get_date_range(range_name)
+        statements[f"statistics summary, {range_name}"] = select(
+            amount_total(expense_table.c.amount > 0), amount_total(expense_table.c.amount < 0)
+        ).where(
+            expense_table.c.user_id == user_id,
+            expense_table.c.expense_date >= start_date,
+            expense_table.c.expense_date <= end_date
+        )
+
+    connection = db.session.connection()
+    report = []
+    for name, statement in statements.items():
+        # Bind parameters the way the services do, so the plan sees the same types.
+        compiled = statement.compile(dialect=connection.dialect)
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scanned, removed = _scanned_relations(plan[0]["Plan"])
+        report.append({"query": name, "partitions": scanned, "subplans_removed": removed})
+    return report
+
+
+@click.group("partition-expenses")
+def partition_expenses_cli():
+    """Range partitioning of user_expense by expense_date."""
+
+
+@partition_expenses_cli.command("migrate")
+@click.option("--interval", type=click.Choice(sorted(INTERVALS)), default=PARTITION_INTERVAL, show_default=True)
+@click.option("--ahead", default=PARTITIONS_AHEAD, show_default=True, help="Future periods to create.")
+@click.option("--drop-old", is_flag=True, help="Drop the old table instead of keeping it for rollback.")
+@with_appcontext
+def migrate_command(interval, ahead, drop_old):
+    """Convert the existing user_expense table into a partitioned one."""
+    if is_partitioned():
+        click.echo("user_expense is already partitioned")
+        return
+    copied = migrate_to_partitioned(interval, ahead, drop_old)
+    click.echo(f"Copied {copied} rows into {len(existing_partitions())} partitions")
+
+
+@partition_expenses_cli.command("maintain")
+@click.option("--interval", type=click.Choice(sorted(INTERVALS)), default=PARTITION_INTERVAL, show_default=True)
+@click.option("--ahead", default=PARTITIONS_AHEAD, show_default=True, help="Future periods to keep ready.")
+@with_appcontext
+def maintain_command(interval, ahead):
+    """Create upcoming partitions and move rows out of the default partition."""
+    if not is_partitioned():
+        raise click.ClickException("user_expense is not partitioned, run `flask partition-expenses migrate` first")
+    created = maintain_partitions(interval, ahead)
+    click.echo(f"Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+
+
+@partition_expenses_cli.command("explain")
+@click.option("--user-id", type=int, required=True)
+@with_appcontext
+def explain_command(user_id):
+    """Check that list and statistics queries only touch the partitions in their date range."""
+    if not is_partitioned():
+        raise click.ClickException("user_expense is not partitioned")
+    total = len(existing_partitions())
+    unpruned = 0
+    for entry in pruning_report(user_id):
+        touched = len(entry["partitions"])
+        click.echo(f"{entry['query']}: {touched}/{total} partitions {', '.join(entry['partitions'])}")
+        if total > 1 and touched >= total:
+            unpruned += 1
+    if unpruned:
+        raise click.ClickException(f"{unpruned} queries scan every partition")
@@ -0,0 +1,68 @@
+import os
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_app_load_seconds = None
+
+
+def record_app_load(seconds):
+    global _app_load_seconds
+    _app_load_seconds = seconds
+
+
+def app_load_seconds():
+    return _app_load_seconds
+
+
+def memory_usage():
+    """Resident, proportional and private memory of this process in bytes.
+
+    After a preloaded fork most of a worker's RSS is shared with the master,
+    PSS splits shared pages between the processes using them and private is
+    what the worker alone would free on exit. Outside Linux only RSS is known.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    fields[key] = int(rest.split()[0]) * 1024
+    except OSError:
+        pass
+
+    if "Rss" in fields:
+        return {
+            "rss": fields["Rss"],
+            "pss": fields.get("Pss"),
+            "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        }
+    if resource is not None:
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss": peak if os.uname().sysname == "Darwin" else peak * 1024, "pss": None, "private": None}
+    return {"rss": None, "pss": None, "private": None}
+
+
+def format_memory(usage):
+    return ", ".join(
+        f"{kind} {value / (1024 * 1024):.1f} MiB" for kind, value in usage.items() if value is not None
+    )
+
+
+def process_gauges():
+    gauges = [(
+        "moneytalks_process_memory_bytes",
+        "Memory of this worker by kind: rss, pss (shared pages split) and private.",
+        [({"kind": kind, "pid": os.getpid()}, value) for kind, value in memory_usage().items() if value is not None],
+    )]
+    if _app_load_seconds is not None:
+        gauges.append((
+            "moneytalks_app_load_seconds",
+            "Time spent importing and initializing the Flask app.",
+            [({"pid": os.getpid()}, _app_load_seconds)],
+        ))
+    return gauges
@@ -0,0 +1,137 @@
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 10))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 300))
+PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of running threads and aggregates them as collapsed stacks.
+
+    Nothing runs while the profiler is stopped: the sampler thread only exists
+    between start() and stop(), and the per-request hook is a single attribute check.
+    """
+
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS, output_dir=PROFILER_OUTPUT_DIR):
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self.running = False
+        self.request_sample_rate = None
+        self.last_output_path = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stacks = Counter()
+        self._sampled_threads = set()
+        self._started_at = None
+
+    def start(self, request_sample_rate=None, max_seconds=PROFILER_MAX_SECONDS):
+        with self._lock:
+            if self.running:
+                return False
+            self.request_sample_rate = request_sample_rate
+            self._stacks = Counter()
+            self._sampled_threads = set()
+            self._stop_event.clear()
+            self._started_at = time.time()
+            self._thread = threading.Thread(
+                target=self._run, args=(max_seconds,), name="sampling-profiler", daemon=True
+            )
+            self.running = True
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return None
+            self.running = False
+            self._stop_event.set()
+            thread = self._thread
+        if thread is not threading.current_thread():
+            thread.join()
+        return self._write()
+
+    def toggle(self):
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def status(self):
+        return {
+            "running": self.running,
+            "request_sample_rate": self.request_sample_rate,
+            "samples": sum(self._stacks.values()),
+            "started_at": self._started_at if self.running else None,
+            "last_output_path": self.last_output_path,
+        }
+
+    def begin_request(self):
+        if not self.running or self.request_sample_rate is None:
+            return
+        if random.random() < self.request_sample_rate:
+            self._sampled_threads.add(threading.get_ident())
+
+    def end_request(self):
+        if self._sampled_threads:
+            self._sampled_threads.discard(threading.get_ident())
+
+    def _run(self, max_seconds):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + max_seconds
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_ident:
+                    continue
+                if self.request_sample_rate is not None and thread_id not in self._sampled_threads:
+                    continue
+                self._stacks[collapse_stack(frame)] += 1
+            if time.monotonic() >= deadline:
+                self.running = False
+                self._write()
+                return
+
+    def _write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = f"{os.getpid()}-{int(self._started_at)}.collapsed"
+        path = os.path.join(self.output_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.last_output_path = path
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def _handle_toggle_signal(signum, frame):
+    threading.Thread(target=profiler.toggle, daemon=True).start()
+
+
+def install_toggle_signal():
+    toggle_signal = getattr(signal, "SIGUSR2", None)
+    if toggle_signal is not None and threading.current_thread() is threading.main_thread():
+        signal.signal(toggle_signal, _handle_toggle_signal)
+
+
+def init_profiler(app):
+    app.before_request(profiler.begin_request)
+    app.teardown_request(lambda exc: profiler.end_request())
+    install_toggle_signal()
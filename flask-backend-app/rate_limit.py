@@ -0,0 +1,125 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from custom_exception import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Token buckets per user and message kind: `burst` requests at once, refilled
+# at `per_minute`. Checked before any llm_services call is made.
+RATE_LIMITS = {
+    "text": (int(os.getenv("RATE_LIMIT_TEXT_BURST", 10)), float(os.getenv("RATE_LIMIT_TEXT_PER_MINUTE", 20))),
+    "image": (int(os.getenv("RATE_LIMIT_IMAGE_BURST", 3)), float(os.getenv("RATE_LIMIT_IMAGE_PER_MINUTE", 5))),
+}
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+MEMORY_BACKEND_MAX_KEYS = 100_000
+
+
+class MemoryBackend:
+    """Buckets kept in this process. Each worker enforces the limit on its own.
+
+    Buckets are kept in update order; past `max_keys` the least recently used
+    ones are dropped, which costs O(1) per call.
+    """
+
+    def __init__(self, max_keys=MEMORY_BACKEND_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate_per_second, cost):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at, _, _ = self._buckets.get(key, (capacity, now, capacity, rate_per_second))
+            tokens = min(capacity, tokens + (now - updated_at) * rate_per_second)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0
+            else:
+                retry_after = (cost - tokens) / rate_per_second
+            self._buckets[key] = (tokens, now, capacity, rate_per_second)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._evict_oldest(now)
+        return retry_after
+
+    def _evict_oldest(self, now):
+        key, (tokens, updated_at, capacity, rate_per_second) = self._buckets.popitem(last=False)
+        # A bucket that has refilled completely holds no information; dropping
+        # one that has not gives that user a fresh burst.
+        if tokens + (now - updated_at) * rate_per_second < capacity:
+            logger.debug("Rate limit bucket %s evicted before refilling", key)
+
+
+class RedisBackend:
+    """Buckets shared by every worker through Redis, updated atomically in a Lua script.
+
+    Needs the optional `redis` package and RATE_LIMIT_BACKEND=redis.
+    """
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url=RATE_LIMIT_REDIS_URL):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate_per_second, cost):
+        return float(self._script(keys=[f"ratelimit:{key}"], args=[capacity, rate_per_second, cost]))
+
+
+class RateLimiter:
+    def __init__(self, backend=None, limits=RATE_LIMITS):
+        self.limits = limits
+        self._backend = backend
+
+    @property
+    def backend(self):
+        # Created on first use so forked workers open their own Redis connections.
+        if self._backend is None:
+            self._backend = RedisBackend() if RATE_LIMIT_BACKEND == "redis" else MemoryBackend()
+        return self._backend
+
+    def check(self, user_id, kind, cost=1):
+        """Take `cost` tokens from the user's bucket or raise RateLimitExceeded."""
+        capacity, per_minute = self.limits[kind]
+        if per_minute <= 0:
+            return
+        cost = min(cost, capacity)
+        try:
+            retry_after = self.backend.take(f"{kind}:{user_id}", capacity, per_minute / 60.0, cost)
+        except Exception:
+            # A shared backend outage should not take the chat down with it.
+            logger.exception("Rate limit backend failed, letting the request through")
+            return
+        if retry_after > 0:
+            seconds = max(1, math.ceil(retry_after))
+            raise RateLimitExceeded(f"Bạn gửi quá nhanh, vui lòng thử lại sau {seconds} giây", seconds)
+
+
+limiter = RateLimiter()
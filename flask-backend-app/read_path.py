@@ -0,0 +1,115 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, cast, func, or_, select
+
+from models import db, UserExpense, Message
+from money import to_amount
+
+# Read-only list endpoints select these columns with Core statements and run
+# them on the session's connection, so rows come back as plain Row tuples
+# without ORM hydration or identity-map tracking.
+expense_table = UserExpense.__table__
+message_table = Message.__table__
+
+EXPENSE_RECORD_COLUMNS = (
+    expense_table.c.id,
+    expense_table.c.amount,
+    expense_table.c.description,
+    expense_table.c.expense_date,
+    expense_table.c.created_at,
+    expense_table.c.updated_at,
+)
+
+MESSAGE_RECORD_COLUMNS = (
+    message_table.c.id,
+    message_table.c.role,
+    message_table.c.content,
+    message_table.c.timestamp,
+)
+
+def fetch_records(statement, params=None):
+    return db.session.connection().execute(statement, params or {}).all()
+
+def fetch_scalar(statement, params=None):
+    return db.session.connection().execute(statement, params or {}).scalar()
+
+def select_expenses(*extra_columns):
+    return select(*EXPENSE_RECORD_COLUMNS, *extra_columns)
+
+def select_messages(*extra_columns):
+    return select(*MESSAGE_RECORD_COLUMNS, *extra_columns)
+
+def amount_total(where=None):
+    """SUM(amount) as an exact integer, 0 when nothing matches.
+
+    Postgres widens SUM(bigint) to numeric, the cast brings it back to BIGINT so
+    rows carry Python ints instead of Decimals.
+    """
+    total = func.sum(expense_table.c.amount)
+    if where is not None:
+        total = total.filter(where)
+    return func.coalesce(cast(total, BigInteger), 0)
+
+def expense_filter_conditions(user_id, filters):
+    """Translate expense filters into WHERE conditions, raises ValueError on bad input.
+
+    Shared by /expenses, the export and chat queries; `key_words` are OR-matched.
+    """
+    conditions = [expense_table.c.user_id == user_id]
+
+    if filters.get("keyword"):
+        conditions.append(expense_table.c.description.ilike(f"%{filters['keyword']}%"))
+
+    key_words = [word for word in filters.get("key_words") or [] if word and word.strip()]
+    if key_words:
+        conditions.append(or_(*[expense_table.c.description.ilike(f"%{word.strip()}%") for word in key_words]))
+
+    start_date_str = filters.get("start_date")
+    if start_date_str:
+        try:
+            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("Invalid start_date format. Use YYYY-MM-DD.")
+        conditions.append(expense_table.c.expense_date >= start_date)
+
+    end_date_str = filters.get("end_date")
+    if end_date_str:
+        try:
+            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("Invalid end_date format. Use YYYY-MM-DD.")
+        conditions.append(expense_table.c.expense_date <= end_date)
+
+    min_amount = filters.get("min_amount")
+    if min_amount not in (None, ""):
+        try:
+            min_amount = to_amount(min_amount)
+        except ValueError:
+            raise ValueError("Invalid min_amount format. Must be a number.")
+        conditions.append(expense_table.c.amount >= min_amount)
+
+    max_amount = filters.get("max_amount")
+    if max_amount not in (None, ""):
+        try:
+            max_amount = to_amount(max_amount)
+        except ValueError:
+            raise ValueError("Invalid max_amount format. Must be a number.")
+        conditions.append(expense_table.c.amount <= max_amount)
+
+    return conditions
+
+def expense_sort_order(filters):
+    sort_info = filters.get("sort", {})
+    sort_field_name = sort_info.get("field", "expense_date")
+    sort_order = sort_info.get("order", "desc")
+
+    sortable_fields = {
+        "expense_date": expense_table.c.expense_date,
+        "amount": expense_table.c.amount
+    }
+
+    sort_column = sortable_fields.get(sort_field_name, expense_table.c.expense_date)
+
+    if sort_order.lower() == "desc":
+        return sort_column.desc()
+    return sort_column.asc()
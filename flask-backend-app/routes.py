@@ -1,11 +1,22 @@
-from flask import Blueprint, request, jsonify
-from custom_exception import JWTMismatchError, NotFoundError, LlmServiceError
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from datetime import datetime
+from custom_exception import JWTMismatchError, NotFoundError, LlmServiceError, ForbiddenError, RateLimitExceeded, InvalidImageError
 from jsonschema import validate, ValidationError
 from services import create_or_get_user, create_jwt,jwt_token_verify, logout
 from services import get_user_messages_paginated, process_user_text_message, process_user_image_message,process_assistant_response_message, delete_all_user_messages, delete_user_message
 from services import get_user_expenses, get_user_single_expense, add_user_expenses, update_user_expense, delete_user_expense, delete_many_user_expenses
 from services import get_user_statistics_summary, get_user_statistics_chart_data
+from services import admin_token_verify, get_user_changes, export_user_expenses, import_user_expenses
+from services import get_query_message_results, delete_selected_expenses, apply_expense_batch
+from exporters import EXPORT_FORMATS
+from profiler import profiler, PROFILER_MAX_SECONDS
+from rate_limit import limiter
+from http_caching import not_modified_response
+from image_pipeline import MAX_IMAGES_PER_MESSAGE
+from serializers import serialize_expense, serialize_message
 import jwt
+import shutil
+import tempfile
 from models import db
 
 login_schema = {
@@ -72,6 +83,9 @@ user_bp = Blueprint("user", __name__)
 def get_messages():
     try:
         user = jwt_token_verify(request.headers)
+        not_modified = not_modified_response(user.id)
+        if not_modified is not None:
+            return not_modified
         
         limit = int(request.args.get("limit", 20))
         
@@ -97,6 +111,26 @@ def get_messages():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
     
+def message_error_response(e):
+    """Response for an error raised while posting a message.
+
+    Shared with the ASGI chat path (asgi.chat_turn) so both entry points
+    answer with the same statuses.
+    """
+    if isinstance(e, JWTMismatchError):
+        return jsonify({"error": str(e)}), 434
+    if isinstance(e, jwt.ExpiredSignatureError):
+        return jsonify({"error": "Token expired"}), 401
+    if isinstance(e, jwt.InvalidTokenError):
+        return jsonify({"error": "Invalid token"}), 401
+    if isinstance(e, RateLimitExceeded):
+        return jsonify({"error": str(e)}), 429, {"Retry-After": str(e.retry_after)}
+    if isinstance(e, LlmServiceError):
+        return jsonify({"error": str(e)}), 502
+    if isinstance(e, InvalidImageError):
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"error": str(e)}), 500
+
 @user_bp.route("/message", methods=["POST"])
 def post_message():
     try:
@@ -120,45 +154,72 @@ def post_message():
             if not content:
                 return jsonify({"error": "Empty message!"}), 400
             if(role == "user"):
+                limiter.check(user.id, "text")
                 response = process_user_text_message(user.id, content)
                 return jsonify({"msg": "Success", "response": response}), 200
             if(role == "assistant"):
                 response = process_assistant_response_message(user.id, content)
                 return jsonify({"msg": "Success", "response": response}), 200
         elif data_type == "image":
-            if "file" not in request.files:
+            # Several shots of one long receipt arrive as repeated "file" fields.
+            files = request.files.getlist("file")
+            if not files:
                 return jsonify({"error": "No file uploaded!"}), 400
-            file = request.files["file"]
-            message = process_user_image_message(user.id, file)
+            # Before the limiter, so an oversized batch does not spend the user's quota.
+            if len(files) > MAX_IMAGES_PER_MESSAGE:
+                return jsonify({"error": f"Chỉ được gửi tối đa {MAX_IMAGES_PER_MESSAGE} ảnh mỗi lần"}), 400
+            limiter.check(user.id, "image", cost=len(files))
+            message = process_user_image_message(user.id, files)
             return jsonify({"msg": "Success", "response": message}), 200
 
+    except Exception as e:
+        db.session.rollback()
+        return message_error_response(e)
+
+@user_bp.route("/message/<int:message_id>", methods=["DELETE"])
+def delete_message(message_id):
+    try:
+        user = jwt_token_verify(request.headers)
+        message = delete_user_message(user.id, message_id)
+
+        message_dict = {**serialize_message(message), "user_id": message.user_id}
+
+        return jsonify({"msg": "Success","deleted_message": message_dict}), 200
     except JWTMismatchError as e:
         return jsonify({"error": str(e)}), 434
     except jwt.ExpiredSignatureError:
         return jsonify({"error": "Token expired"}), 401
     except jwt.InvalidTokenError:
         return jsonify({"error": "Invalid token"}), 401
-    except LlmServiceError as e:
-        return jsonify({"error": str(e)}), 502
+    except NotFoundError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
-
-@user_bp.route("/message/<int:message_id>", methods=["DELETE"])
-def delete_message(message_id):
+    
+@user_bp.route("/message/<int:message_id>/results", methods=["GET"])
+def get_message_query_results(message_id):
     try:
         user = jwt_token_verify(request.headers)
-        message = delete_user_message(user.id, message_id)
+        not_modified = not_modified_response(user.id)
+        if not_modified is not None:
+            return not_modified
 
-        message_dict = {
-            "id": message.id,
-            "user_id": message.user_id,
-            "role": message.role,
-            "content": message.content,
-            "timestamp": message.timestamp.isoformat()
-        }
+        page = int(request.args.get("page", 1))
+        page_size = int(request.args.get("pageSize", 20))
+
+        result = get_query_message_results(user.id, message_id, page, page_size)
+        return jsonify({
+            "msg": "Success",
+            "query": result["query"],
+            "aggregates": result["aggregates"],
+            "expenses": result["expenses"],
+            "page": result["current_page"],
+            "page_size": result["page_size"],
+            "total_pages": result["total_pages"],
+            "total_records": result["total_records"]
+        }), 200
 
-        return jsonify({"msg": "Success","deleted_message": message_dict}), 200
     except JWTMismatchError as e:
         return jsonify({"error": str(e)}), 434
     except jwt.ExpiredSignatureError:
@@ -167,10 +228,12 @@ def delete_message(message_id):
         return jsonify({"error": "Invalid token"}), 401
     except NotFoundError as e:
         return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
-    
+
 @user_bp.route("/message", methods=["DELETE"])
 def delete_messages():
     try:
@@ -188,25 +251,31 @@ def delete_messages():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+def expense_filters_from_args(args):
+    return {
+        "sort":{
+            "field": args.get("sortField", "expense_date"),
+            "order": args.get("sortOrder", "desc")
+        },
+        "keyword": args.get("keyword", ""),
+        "start_date": args.get("startDate", ""),
+        "end_date": args.get("endDate", ""),
+        "min_amount": args.get("minAmount", ""),
+        "max_amount": args.get("maxAmount", "")
+    }
+
 @user_bp.route("/expenses", methods=["GET"])
 def get_expenses():
     try:
         user = jwt_token_verify(request.headers)
+        not_modified = not_modified_response(user.id)
+        if not_modified is not None:
+            return not_modified
 
         page = int(request.args.get("page", 1))
         page_size = int(request.args.get("pageSize", 20))
         
-        filters = {
-            "sort":{
-                "field": request.args.get("sortField", "expense_date"),
-                "order": request.args.get("sortOrder", "desc")
-            },
-            "keyword": request.args.get("keyword", ""),
-            "start_date": request.args.get("startDate", ""),
-            "end_date": request.args.get("endDate", ""),
-            "min_amount": request.args.get("minAmount", ""),
-            "max_amount": request.args.get("maxAmount", "")
-        }
+        filters = expense_filters_from_args(request.args)
 
         result = get_user_expenses(user.id, filters, page, page_size)
         return jsonify({
@@ -228,10 +297,50 @@ def get_expenses():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
     
+@user_bp.route("/expenses/export", methods=["GET"])
+def export_expenses():
+    try:
+        user = jwt_token_verify(request.headers)
+
+        export_format = request.args.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": "Invalid format!"}), 400
+        compress = request.args.get("gzip", "0") in ["1", "true"]
+
+        filters = expense_filters_from_args(request.args)
+        chunks = export_user_expenses(user.id, filters, export_format, compress)
+
+        filename = f"expenses-{datetime.now().strftime('%Y%m%d')}.{EXPORT_FORMATS[export_format]['extension']}"
+        mimetype = EXPORT_FORMATS[export_format]["mimetype"]
+        if compress:
+            filename += ".gz"
+            mimetype = "application/gzip"
+
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except JWTMismatchError as e:
+        return jsonify({"error": str(e)}), 434
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 @user_bp.route("/expenses/<int:expense_id>", methods=["GET"])
 def get_single_expense(expense_id):
     try:
         user = jwt_token_verify(request.headers)
+        not_modified = not_modified_response(user.id)
+        if not_modified is not None:
+            return not_modified
 
         result = get_user_single_expense(user.id, expense_id)
         return jsonify({
@@ -292,6 +401,56 @@ def add_expenses():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@user_bp.route("/expenses/import", methods=["POST"])
+def import_expenses():
+    try:
+        user = jwt_token_verify(request.headers)
+
+        if "file" not in request.files:
+            return jsonify({"error": "No file uploaded!"}), 400
+        file = request.files["file"]
+
+        # The upload is closed with the request, before the streamed body has
+        # read past the first batch; the generator reads its own copy instead.
+        upload = tempfile.TemporaryFile()
+        try:
+            shutil.copyfileobj(file.stream, upload)
+            upload.seek(0)
+            progress = import_user_expenses(user.id, upload)
+            # Running up to the first batch turns a CSV without date/amount columns into a 400.
+            first_progress = next(progress)
+        except Exception:
+            upload.close()
+            raise
+
+        def generate():
+            dumps = current_app.json.dumps
+            try:
+                yield dumps(first_progress) + "\n"
+                for item in progress:
+                    yield dumps(item) + "\n"
+            except Exception as e:
+                db.session.rollback()
+                yield dumps({"error": str(e)}) + "\n"
+            finally:
+                progress.close()
+                upload.close()
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    except JWTMismatchError as e:
+        return jsonify({"error": str(e)}), 434
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 update_expenses_schema = {
     "type": "object",
     "properties": {
@@ -332,14 +491,7 @@ def delete_expense(expenses_id):
         user = jwt_token_verify(request.headers)
         expense = delete_user_expense(user.id, expenses_id)
 
-        expense_dict = {
-            "id": expense.id,
-            "amount": expense.amount,
-            "description": expense.description,
-            "expense_date": expense.expense_date.isoformat(),
-            "created_at": expense.created_at.isoformat(),
-            "updated_at": expense.updated_at.isoformat()
-        }
+        expense_dict = serialize_expense(expense)
 
         return jsonify({"msg": "Success","deleted_expense": expense_dict}), 200
 
@@ -384,10 +536,138 @@ def delete_multiple_expenses():
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
     
+BATCH_MAX_OPERATIONS = 500
+batch_expenses_schema = {
+    "type": "object",
+    "properties": {
+        "operations": {
+            "type": "array",
+            "maxItems": BATCH_MAX_OPERATIONS,
+            "items": {
+                "oneOf": [
+                    {
+                        "type": "object",
+                        "properties": {
+                            "op": {"const": "insert"},
+                            "ref": {"type": ["string", "integer"]},
+                            "expense": add_expenses_schema["properties"]["expenses"]["items"]
+                        },
+                        "required": ["op", "expense"]
+                    },
+                    {
+                        "type": "object",
+                        "properties": {
+                            "op": {"const": "update"},
+                            "id": {"type": "integer"},
+                            "expense": {
+                                "type": "object",
+                                "properties": {
+                                    "amount": {"type": "number"},
+                                    "description": {"type": "string"},
+                                    "expense_date": {"type": "string", "pattern": "^\\d{4}-\\d{2}-\\d{2}$"}
+                                },
+                                "minProperties": 1
+                            }
+                        },
+                        "required": ["op", "id", "expense"]
+                    },
+                    {
+                        "type": "object",
+                        "properties": {
+                            "op": {"const": "delete"},
+                            "id": {"type": "integer"}
+                        },
+                        "required": ["op", "id"]
+                    }
+                ]
+            }
+        }
+    },
+    "required": ["operations"]
+}
+
+@user_bp.route("/expenses/batch", methods=["POST"])
+def batch_expenses():
+    try:
+        user = jwt_token_verify(request.headers)
+        data = request.get_json()
+        validate(data, batch_expenses_schema)
+        results = apply_expense_batch(user.id, data["operations"])
+
+        return jsonify({"msg": "Success", "results": results}), 200
+
+    except JWTMismatchError as e:
+        return jsonify({"error": str(e)}), 434
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    except ValidationError as e:
+        return jsonify({"error": e.message}), 400
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@user_bp.route("/changes", methods=["GET"])
+def get_changes():
+    try:
+        user = jwt_token_verify(request.headers)
+
+        since_str = request.args.get("since")
+        since = int(since_str) if since_str else None
+        limit = int(request.args.get("limit", 500))
+
+        result = get_user_changes(user.id, since, limit)
+        return jsonify({"msg": "Success", **result}), 200
+
+    except JWTMismatchError as e:
+        return jsonify({"error": str(e)}), 434
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@user_bp.route("/expenses/selections/<token>/delete", methods=["POST"])
+def delete_expense_selection(token):
+    try:
+        user = jwt_token_verify(request.headers)
+        data = request.get_json(silent=True) or {}
+
+        exclude_ids = data.get("exclude_ids", [])
+        if not isinstance(exclude_ids, list) or not all(isinstance(i, int) for i in exclude_ids):
+            return jsonify({"error": "'exclude_ids' phải là danh sách ID"}), 400
+
+        deleted_count = delete_selected_expenses(user.id, token, exclude_ids)
+
+        return jsonify({"msg": "Success", "deleted_count": deleted_count}), 200
+
+    except JWTMismatchError as e:
+        return jsonify({"error": str(e)}), 434
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    except NotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 @user_bp.route("/statistics/summary", methods=["GET"])
 def get_statistics_summary():
     try:
         user = jwt_token_verify(request.headers)
+        not_modified = not_modified_response(user.id, daily=True)
+        if not_modified is not None:
+            return not_modified
         range = request.args.get("range","today")
 
         if range not in ["today", "7d", "30d", "1y"]:
@@ -417,6 +697,9 @@ def get_statistics_summary():
 def get_statistics_chart_data():
     try:
         user = jwt_token_verify(request.headers)
+        not_modified = not_modified_response(user.id, daily=True)
+        if not_modified is not None:
+            return not_modified
         user_id = user.id
 
         range = request.args.get("range", "7d")
@@ -435,4 +718,56 @@ def get_statistics_chart_data():
         return jsonify({"error": str(e)}), 404
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+admin_bp = Blueprint("admin", __name__)
+@admin_bp.route("/profiler", methods=["GET"])
+def get_profiler_status():
+    try:
+        admin_token_verify(request.headers)
+        return jsonify({"msg": "Success", "profiler": profiler.status()}), 200
+    except ForbiddenError as e:
+        return jsonify({"error": str(e)}), 403
+
+@admin_bp.route("/profiler/start", methods=["POST"])
+def start_profiler():
+    try:
+        admin_token_verify(request.headers)
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+
+        sample_rate = data.get("request_sample_rate")
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+            if not 0 < sample_rate <= 1:
+                return jsonify({"error": "request_sample_rate must be in (0, 1]"}), 400
+
+        # NaN fails both comparisons, inf fails the upper bound.
+        max_seconds = float(data.get("max_seconds", 60))
+        if not 0 < max_seconds <= PROFILER_MAX_SECONDS:
+            return jsonify({"error": f"max_seconds must be in (0, {PROFILER_MAX_SECONDS:g}]"}), 400
+
+        if not profiler.start(request_sample_rate=sample_rate, max_seconds=max_seconds):
+            return jsonify({"error": "Profiler is already running"}), 409
+
+        return jsonify({"msg": "Success", "profiler": profiler.status()}), 200
+    except ForbiddenError as e:
+        return jsonify({"error": str(e)}), 403
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@admin_bp.route("/profiler/stop", methods=["POST"])
+def stop_profiler():
+    try:
+        admin_token_verify(request.headers)
+        output_path = profiler.stop()
+        if not output_path:
+            return jsonify({"error": "Profiler is not running"}), 409
+
+        return jsonify({"msg": "Success", "output_path": output_path}), 200
+    except ForbiddenError as e:
+        return jsonify({"error": str(e)}), 403
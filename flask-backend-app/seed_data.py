@@ -0,0 +1,203 @@
+import csv
+import io
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from models import db
+
+SEED_GOOGLE_ID_PREFIX = "seed-"
+COPY_CHUNK_ROWS = 50_000
+# Dates are generated backwards from this day rather than from today, so a
+# seed gives the same rows whenever it is run and benchmark date filters keep
+# hitting the same data.
+SEED_ANCHOR_DATE = os.getenv("SEED_ANCHOR_DATE", "2025-06-01")
+
+EXPENSE_DESCRIPTIONS = [
+    "Cà phê sáng", "Trà sữa", "Bún bò Huế", "Phở bò", "Cơm tấm", "Bánh mì",
+    "Đổ xăng xe máy", "Grab đi làm", "Gửi xe", "Tiền điện", "Tiền nước",
+    "Tiền internet", "Tiền nhà", "Đi chợ", "Siêu thị Coopmart", "Mua quần áo",
+    "Mua giày", "Xem phim", "Ăn lẩu với bạn", "Sinh nhật bạn", "Khám bệnh",
+    "Mua thuốc", "Học phí tiếng Anh", "Mua sách", "Nạp tiền điện thoại",
+    "Đám cưới đồng nghiệp", "Sửa xe", "Cắt tóc", "Mua đồ gia dụng", "Du lịch Đà Lạt",
+]
+
+INCOME_DESCRIPTIONS = [
+    "Lương tháng", "Thưởng dự án", "Tiền làm thêm", "Bán đồ cũ", "Lì xì",
+    "Tiền lãi ngân hàng", "Hoàn tiền mua hàng", "Bạn trả nợ", "Freelance thiết kế",
+]
+
+USER_MESSAGES = [
+    "hôm nay ăn sáng hết 35k", "chiều nay uống cà phê 40k", "đổ xăng 60k",
+    "nhận lương 15tr", "tháng này tiêu bao nhiêu tiền ăn uống?",
+    "xóa khoản chi hôm qua", "sửa khoản 12 thành 50k", "tìm các khoản chi trên 500k tháng trước",
+    "mua sách 120k và bút 15k", "thời tiết hôm nay thế nào?",
+]
+
+ASSISTANT_MESSAGE = "Các khoản dưới đây đã được ghi nhận, bạn có muốn thêm không?"
+
+
+def power_law_weights(count, exponent):
+    return [1.0 / ((rank + 1) ** exponent) for rank in range(count)]
+
+
+def random_amount(rng, income_ratio):
+    if rng.random() < income_ratio:
+        return rng.choice([1, 2, 5, 10, 15, 20, 30]) * 500_000
+    amount = int(rng.lognormvariate(10.8, 1.0)) // 1000 * 1000
+    return -max(amount, 1000)
+
+
+def random_datetime(rng, start, span_seconds):
+    return start + timedelta(seconds=rng.randrange(span_seconds))
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into `table` with COPY, flushing every COPY_CHUNK_ROWS rows."""
+    statement = f'COPY "{table}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    total = 0
+    pending = 0
+
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= COPY_CHUNK_ROWS:
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            total += pending
+            pending = 0
+            buffer.seek(0)
+            buffer.truncate()
+
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += pending
+    return total
+
+
+def generate_dataset(users, expenses, messages, years=3, seed=42, income_ratio=0.15, exponent=1.1, anchor=None):
+    rng = random.Random(seed)
+    now = anchor or datetime.fromisoformat(SEED_ANCHOR_DATE)
+    start = now - timedelta(days=365 * years)
+    span_seconds = int((now - start).total_seconds())
+
+    raw_connection = db.engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+
+        prefix = f"{SEED_GOOGLE_ID_PREFIX}{seed}-"
+        user_rows = (
+            (
+                f"{prefix}{n}",
+                f"seed{seed}.user{n}@example.com",
+                f"Người dùng {n}",
+                f"https://example.com/avatar/{n}.png",
+                now,
+            )
+            for n in range(users)
+        )
+        copy_rows(cursor, "user", ("google_id", "email", "name", "picture", "created_at"), user_rows)
+
+        cursor.execute(
+            'SELECT id FROM "user" WHERE google_id LIKE %s ORDER BY id',
+            (f"{prefix}%",)
+        )
+        user_ids = [row[0] for row in cursor.fetchall()]
+        cum_weights = []
+        running = 0.0
+        for weight in power_law_weights(len(user_ids), exponent):
+            running += weight
+            cum_weights.append(running)
+
+        def expense_rows():
+            for _ in range(expenses):
+                user_id = rng.choices(user_ids, cum_weights=cum_weights)[0]
+                amount = random_amount(rng, income_ratio)
+                descriptions = INCOME_DESCRIPTIONS if amount > 0 else EXPENSE_DESCRIPTIONS
+                expense_date = random_datetime(rng, start, span_seconds)
+                yield (user_id, amount, rng.choice(descriptions), expense_date, expense_date, expense_date)
+
+        expense_count = copy_rows(
+            cursor, "user_expense",
+            ("user_id", "amount", "description", "expense_date", "created_at", "updated_at"),
+            expense_rows()
+        )
+
+        def message_rows():
+            for n in range(messages):
+                user_id = rng.choices(user_ids, cum_weights=cum_weights)[0]
+                timestamp = start + timedelta(seconds=span_seconds * n // max(messages, 1))
+                if n % 2 == 0:
+                    content = {"type": "message", "message": rng.choice(USER_MESSAGES)}
+                    role = "user"
+                else:
+                    amount = random_amount(rng, income_ratio)
+                    content = {
+                        "type": "comfirmation_request",
+                        "request_type": "insert_expenses",
+                        "data": {
+                            "message": ASSISTANT_MESSAGE,
+                            "data": {"expenses": [{
+                                "description": rng.choice(EXPENSE_DESCRIPTIONS),
+                                "amount": amount,
+                                "expense_date": timestamp.date().isoformat(),
+                            }]}
+                        }
+                    }
+                    role = "assistant"
+                yield (user_id, role, json.dumps(content, ensure_ascii=False), timestamp)
+
+        message_count = copy_rows(cursor, "message", ("user_id", "role", "content", "timestamp"), message_rows())
+
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+
+    return {"users": len(user_ids), "expenses": expense_count, "messages": message_count}
+
+
+def delete_seeded_data(seed):
+    prefix = f"{SEED_GOOGLE_ID_PREFIX}{seed}-%"
+    seeded_users = text('SELECT id FROM "user" WHERE google_id LIKE :prefix')
+    db.session.execute(text(f"DELETE FROM user_expense WHERE user_id IN ({seeded_users.text})"), {"prefix": prefix})
+    db.session.execute(text(f"DELETE FROM message WHERE user_id IN ({seeded_users.text})"), {"prefix": prefix})
+    db.session.execute(text(f"DELETE FROM change_log WHERE user_id IN ({seeded_users.text})"), {"prefix": prefix})
+    db.session.execute(text(f"DELETE FROM message_archive_segment WHERE user_id IN ({seeded_users.text})"), {"prefix": prefix})
+    db.session.execute(text(f"DELETE FROM expense_selection WHERE user_id IN ({seeded_users.text})"), {"prefix": prefix})
+    db.session.execute(text(f"DELETE FROM conversation_history WHERE user_id IN ({seeded_users.text})"), {"prefix": prefix})
+    db.session.execute(text('DELETE FROM "user" WHERE google_id LIKE :prefix'), {"prefix": prefix})
+    db.session.commit()
+
+
+@click.command("seed-data")
+@click.option("--users", default=1_000, show_default=True, help="Number of users to create.")
+@click.option("--expenses", default=1_000_000, show_default=True, help="Number of UserExpense rows.")
+@click.option("--messages", default=200_000, show_default=True, help="Number of Message rows.")
+@click.option("--years", default=3, show_default=True, help="How many years back expense dates span.")
+@click.option("--seed", default=42, show_default=True, help="Random seed, the dataset is reproducible per seed.")
+@click.option("--anchor-date", type=click.DateTime(formats=["%Y-%m-%d"]), default=SEED_ANCHOR_DATE,
+              show_default=True, help="Latest generated date, dates span --years back from it (env SEED_ANCHOR_DATE).")
+@click.option("--reset", is_flag=True, help="Delete data previously generated with the same seed first.")
+@with_appcontext
+def seed_data_command(users, expenses, messages, years, seed, anchor_date, reset):
+    """Fill the database with a synthetic dataset for scale testing."""
+    if reset:
+        delete_seeded_data(seed)
+    started = datetime.now()
+    counts = generate_dataset(users, expenses, messages, years=years, seed=seed, anchor=anchor_date)
+    elapsed = (datetime.now() - started).total_seconds()
+    click.echo(
+        f"Seeded {counts['users']} users, {counts['expenses']} expenses, "
+        f"{counts['messages']} messages in {elapsed:.1f}s"
+    )
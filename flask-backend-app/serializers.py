@@ -0,0 +1,20 @@
+from message_content import render_content
+
+# Datetimes are left as objects, the app JSON provider writes them in ISO 8601.
+def serialize_expense(expense):
+    return {
+        "id": expense.id,
+        "amount": expense.amount,
+        "description": expense.description,
+        "expense_date": expense.expense_date,
+        "created_at": expense.created_at,
+        "updated_at": expense.updated_at,
+    }
+
+def serialize_message(message):
+    return {
+        "id": message.id,
+        "role": message.role,
+        "content": render_content(message.content),
+        "timestamp": message.timestamp,
+    }
@@ -1,23 +1,53 @@
 from datetime import datetime, timedelta, timezone
-from PIL import Image
 from flask import request, current_app 
+from flask.cli import with_appcontext
+import click
 import jwt
+import hmac
+import secrets
 import os
-import io
-from models import User, Message, UserExpense, db
-from sqlalchemy import func
-from custom_exception import JWTMismatchError, NotFoundError
+from models import User, Message, UserExpense, ExpenseSelection, db
+from sqlalchemy import func, select, insert, update, delete, or_, values, column, cast
+from sqlalchemy import BigInteger, DateTime, Integer, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from custom_exception import JWTMismatchError, NotFoundError, ForbiddenError
+from instrumentation import timed
+from serializers import serialize_expense, serialize_message
+from read_path import expense_table, message_table, fetch_records, fetch_scalar, select_expenses, select_messages
+from read_path import expense_filter_conditions, expense_sort_order, amount_total, EXPENSE_RECORD_COLUMNS
+from money import to_amount, scale_amount
+from change_tracking import record_changes, current_version, collect_changes
+from change_tracking import ENTITY_EXPENSE, ENTITY_MESSAGE, OP_UPSERT, OP_DELETE, OP_CLEAR
+from exporters import csv_chunks, ndjson_chunks, gzip_chunks
+from importers import read_csv_rows, normalize_row, dedupe_key
+from database import read_only, replica_reads
+from message_content import user_text_content, image_content, assistant_text_content, confirmation_content, render_content
+from conversation_context import build_conversation_context, reset_history
+from message_archive import load_archived_page, load_archived_messages, delete_archived_message, delete_all_archived_messages
 from dateutil.relativedelta import relativedelta
-from llm_services.get_request_type_params import extract_request_type
-from llm_services.get_insert_request_params import extract_insert_req
-from llm_services.get_query_request_params import extract_query_req
-from llm_services.get_update_request_params import extract_update_req
-from llm_services.get_delete_request_params import extract_delete_req
-from llm_services.other_message_process import other_message_process
-from llm_services.get_insert_request_params_img import extract_insert_req_from_local_image
+from llm_services.registry import lazy_extractor
+from image_pipeline import prepare_images, extract_all, merge_expenses, upload_url
+
+# Resolved on first call so pure-DB workers and CLI commands never import openai/pydantic.
+extract_request_type = lazy_extractor("extract_request_type")
+extract_insert_req = lazy_extractor("extract_insert_req")
+extract_query_req = lazy_extractor("extract_query_req")
+extract_update_req = lazy_extractor("extract_update_req")
+extract_delete_req = lazy_extractor("extract_delete_req")
+other_message_process = lazy_extractor("other_message_process")
+extract_insert_req_from_local_image = lazy_extractor("extract_insert_req_from_local_image")
+extract_request_type_async = lazy_extractor("extract_request_type_async")
+extract_insert_req_async = lazy_extractor("extract_insert_req_async")
+extract_query_req_async = lazy_extractor("extract_query_req_async")
+extract_update_req_async = lazy_extractor("extract_update_req_async")
+extract_delete_req_async = lazy_extractor("extract_delete_req_async")
+other_message_process_async = lazy_extractor("other_message_process_async")
 
 SECRET_KEY = os.getenv("SECRET_KEY")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 JWT_EXPIRATION_TIME_D = int(os.getenv("JWT_EXPIRATION_TIME_D", 15))
+# A re-login reuses the stored token while it has at least this many days left.
+JWT_REUSE_MIN_REMAINING_D = int(os.getenv("JWT_REUSE_MIN_REMAINING_D", 7))
 
 GOOGLE_TOKEN_INFO_URL = "https://openidconnect.googleapis.com/v1/userinfo"
 
@@ -40,57 +70,118 @@ def jwt_token_verify(request_header):
     #     raise JWTMismatchError("JWT token mismatch")
     return user
 
+def admin_token_verify(request_header):
+    token = request_header.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise ForbiddenError("Admin token required")
+
 #POST /api/v1/auth/google
+user_table = User.__table__
+LOGIN_COLUMNS = (user_table.c.id, user_table.c.email, user_table.c.name, user_table.c.picture, user_table.c.last_login_token)
+
 def create_or_get_user(user_info):
-    user = User.query.filter_by(google_id=user_info.get("sub")).first()
-    if not user:
-        user = User(
-            google_id=user_info.get("sub"),
-            email=user_info.get("email"),
-            name=user_info.get("name"),
-            picture=user_info.get("picture")
+    """Insert or refresh the user in one statement, writing only when name or picture changed.
+
+    The upsert returns the row when it inserted or updated it; otherwise the
+    UNION branch reads the unchanged row, so a repeat login never rewrites it.
+    """
+    insert_statement = pg_insert(user_table).values(
+        google_id=user_info.get("sub"),
+        email=user_info.get("email"),
+        name=user_info.get("name"),
+        picture=user_info.get("picture"),
+        created_at=datetime.now(timezone.utc)
+    )
+    excluded = insert_statement.excluded
+    upserted = insert_statement.on_conflict_do_update(
+        index_elements=[user_table.c.google_id],
+        set_={"name": excluded.name, "picture": excluded.picture},
+        where=or_(
+            user_table.c.name.is_distinct_from(excluded.name),
+            user_table.c.picture.is_distinct_from(excluded.picture)
         )
-        db.session.add(user)
-        db.session.commit()
-    else:
-        user.name = user_info.get("name")
-        user.picture = user_info.get("picture")
-        db.session.commit()
-    return user
+    ).returning(*LOGIN_COLUMNS).cte("upserted")
+
+    statement = select(*upserted.c).union_all(
+        select(*LOGIN_COLUMNS).where(
+            user_table.c.google_id == user_info.get("sub"),
+            ~select(upserted.c.id).exists()
+        )
+    )
+
+    # A row inserted by a concurrent login after this statement's snapshot is
+    # neither returned nor visible; the second attempt sees it.
+    for _ in range(2):
+        user = db.session.execute(statement).one_or_none()
+        if user:
+            return user
+    raise NotFoundError("User not found")
+
+def reusable_login_token(user):
+    """The stored token if it still has a long life ahead and matches the profile, else None."""
+    if not user.last_login_token:
+        return None
+    try:
+        payload = jwt.decode(user.last_login_token, SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+
+    remaining = payload["exp"] - datetime.now(timezone.utc).timestamp()
+    if remaining < JWT_REUSE_MIN_REMAINING_D * 24 * 3600:
+        return None
+    if (payload.get("user_id"), payload.get("email"), payload.get("name")) != (user.id, user.email, user.name):
+        return None
+    return user.last_login_token
 
 def create_jwt(user):
-    payload = {
-        "user_id": user.id,
-        "email": user.email,
-        "name": user.name,
-        "exp": datetime.now(timezone.utc) + timedelta(days=15)
-    }
-    token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-    user = User.query.filter_by(id=user.id).first()
-    user.last_login_token = token
+    # Logins in a storm mostly hand back the token issued last time and write nothing.
+    token = reusable_login_token(user)
+    if token is None:
+        payload = {
+            "user_id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "exp": datetime.now(timezone.utc) + timedelta(days=JWT_EXPIRATION_TIME_D)
+        }
+        token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+        db.session.execute(
+            update(user_table).where(user_table.c.id == user.id).values(last_login_token=token)
+        )
+    # One commit covers the upsert and the token.
     db.session.commit()
     return token
 
-#POST /api/v1/auth/logout
 def logout(user):
     user.last_login_token = None
     db.session.commit()
 
+def commit_new_message(message):
+    db.session.add(message)
+    db.session.flush()
+    record_changes(message.user_id, ENTITY_MESSAGE, OP_UPSERT, [message.id])
+    db.session.commit()
+
 #GET /api/v1/user/message?page=1&pageSize=20
+@read_only
 def get_user_messages_paginated(user_id, limit, before_id):
     if limit > 50:
         limit = 50
 
-    query = (
-        Message.query
-        .filter_by(user_id=user_id)
-        .order_by(Message.id.desc())
+    statement = (
+        select_messages()
+        .where(message_table.c.user_id == user_id)
+        .order_by(message_table.c.id.desc())
     )
 
     if before_id:
-        query = query.filter(Message.id < before_id)
+        statement = statement.where(message_table.c.id < before_id)
 
-    messages_with_extra = query.limit(limit + 1).all()
+    messages_with_extra = fetch_records(statement.limit(limit + 1))
+
+    # Older pages continue transparently into the compressed archive.
+    if len(messages_with_extra) <= limit:
+        archive_before_id = messages_with_extra[-1].id if messages_with_extra else before_id
+        messages_with_extra += load_archived_page(user_id, archive_before_id, limit + 1 - len(messages_with_extra))
 
     has_more = len(messages_with_extra) > limit
     
@@ -100,14 +191,7 @@ def get_user_messages_paginated(user_id, limit, before_id):
     if has_more:
         next_cursor = messages_to_return[-1].id
 
-    formatted_messages = [
-        {
-            "id": msg.id,
-            "role": msg.role,
-            "content": msg.content,
-            "timestamp": msg.timestamp.isoformat()
-        } for msg in messages_to_return
-    ]
+    formatted_messages = [serialize_message(msg) for msg in messages_to_return]
 
     return {
         "messages": formatted_messages,
@@ -117,59 +201,168 @@ def get_user_messages_paginated(user_id, limit, before_id):
         }
     }
 
+DELETE_PREVIEW_SAMPLE_SIZE = int(os.getenv("DELETE_PREVIEW_SAMPLE_SIZE", 20))
+DELETE_SELECTION_TTL_HOURS = int(os.getenv("DELETE_SELECTION_TTL_HOURS", 24))
+
+def delete_selection_conditions(user_id, criteria, max_expense_id=None):
+    conditions = [expense_table.c.user_id == user_id]
+    if criteria.get("delete_ids"):
+        conditions.append(expense_table.c.id.in_(criteria["delete_ids"]))
+    else:
+        if criteria.get("start_date"):
+            conditions.append(expense_table.c.expense_date >= criteria["start_date"])
+        if criteria.get("end_date"):
+            conditions.append(expense_table.c.expense_date <= criteria["end_date"])
+    if max_expense_id is not None:
+        conditions.append(expense_table.c.id <= max_expense_id)
+    return conditions
+
+def purge_expired_selections(user_id=None):
+    """Delete selections past expires_at, for one user or everyone; returns how many went."""
+    selection_table = ExpenseSelection.__table__
+    conditions = [selection_table.c.expires_at < datetime.now(timezone.utc).replace(tzinfo=None)]
+    if user_id is not None:
+        conditions.append(selection_table.c.user_id == user_id)
+    return db.session.execute(delete(selection_table).where(*conditions)).rowcount
+
+@click.command("purge-expense-selections")
+@with_appcontext
+def purge_expense_selections_command():
+    """Delete expired chat delete selections, including those of users who never confirmed."""
+    purged = purge_expired_selections()
+    db.session.commit()
+    click.echo(f"Purged {purged} expired selections")
+
+def create_delete_selection(user_id, criteria):
+    """Summarize the rows matching a chat delete request and store the selection behind a token.
+
+    Only counts, the sum and a capped sample go into the assistant message; the
+    full set is deleted later from the token. Returns None when nothing matches.
+    """
+    conditions = delete_selection_conditions(user_id, criteria)
+
+    summary = fetch_records(
+        select(
+            func.count().label("count"),
+            amount_total().label("total_amount"),
+            func.max(expense_table.c.id).label("max_expense_id"),
+        ).where(*conditions)
+    )[0]
+    if not summary.count:
+        return None
+
+    sample = fetch_records(
+        select(expense_table.c.id, expense_table.c.description, expense_table.c.amount, expense_table.c.expense_date)
+        .where(*conditions)
+        .order_by(expense_table.c.expense_date.desc(), expense_table.c.id.desc())
+        .limit(DELETE_PREVIEW_SAMPLE_SIZE)
+    )
+
+    now = datetime.now(timezone.utc)
+    purge_expired_selections(user_id)
+    selection = ExpenseSelection(
+        token=secrets.token_urlsafe(24),
+        user_id=user_id,
+        criteria=criteria,
+        # Rows added after the preview are never part of the confirmed delete.
+        max_expense_id=summary.max_expense_id,
+        created_at=now,
+        expires_at=now + timedelta(hours=DELETE_SELECTION_TTL_HOURS)
+    )
+    db.session.add(selection)
+
+    return {
+        "token": selection.token,
+        "count": summary.count,
+        "total_amount": summary.total_amount,
+        "truncated": summary.count > len(sample),
+        "sample": [
+            {
+                "id": expense.id,
+                "description": expense.description,
+                "amount": expense.amount,
+                "expense_date": expense.expense_date.isoformat()
+            } for expense in sample
+        ],
+    }
+
 # POST /api/v1/user/message
-def process_user_text_message(user_id, content):
+def save_user_text_message(user_id, content):
     user_message = Message(
         user_id=user_id,
         role="user",
-        content={"type": "message", "message": content},
+        content=user_text_content(content),
         timestamp=datetime.now(timezone.utc)
     )
-    db.session.add(user_message)
-    db.session.commit()
+    commit_new_message(user_message)
+    return user_message
 
-    request_type_result = extract_request_type(content)
+def extract_text_request(content, load_context=None):
+    """Classify a chat message and run the matching extractor, returns (request_type, result).
 
-    match request_type_result.request_type:
+    `load_context()` gives the conversation context; it is only called for the
+    update and delete extractors, which need it to resolve "khoản vừa thêm".
+    """
+    load_context = load_context or (lambda: None)
+    request_type = extract_request_type(content).request_type
+
+    match request_type:
         case "insert_expenses":
-            insert_params = extract_insert_req(content)
+            return request_type, extract_insert_req(content)
+        case "query_expenses":
+            return request_type, extract_query_req(content)
+        case "update_expenses":
+            return request_type, extract_update_req(content, load_context())
+        case "delete_expenses":
+            return request_type, extract_delete_req(content, load_context())
+        case "other":
+            return request_type, other_message_process(content)
+        case _:
+            raise ValueError("Unknown request type")
+
+async def _no_context():
+    return None
+
+async def extract_text_request_async(content, load_context=None):
+    """Async twin of extract_text_request used by the ASGI chat handler, `load_context` is a coroutine function."""
+    load_context = load_context or _no_context
+    request_type = (await extract_request_type_async(content)).request_type
 
+    match request_type:
+        case "insert_expenses":
+            return request_type, await extract_insert_req_async(content)
+        case "query_expenses":
+            return request_type, await extract_query_req_async(content)
+        case "update_expenses":
+            return request_type, await extract_update_req_async(content, await load_context())
+        case "delete_expenses":
+            return request_type, await extract_delete_req_async(content, await load_context())
+        case "other":
+            return request_type, await other_message_process_async(content)
+        case _:
+            raise ValueError("Unknown request type")
+
+def complete_text_request(user_id, request_type, result):
+    """Turn an extractor result into the assistant reply, store it and return it serialized."""
+    match request_type:
+        case "insert_expenses":
             assistance_message = Message(
                 user_id=user_id,
                 role="assistant",
-                content={
-                    "type": "comfirmation_request",
-                    "request_type": "insert_expenses",
-                    "data": {
-                        "message": "Các khoản dưới đây đã được ghi nhận, bạn có muốn thêm không?",
-                        "data": insert_params.model_dump()
-                    }
-                },
+                content=confirmation_content("insert_expenses", result.model_dump(), template="insert_confirm"),
                 timestamp=datetime.now(timezone.utc)
             )
 
         case "query_expenses":
-            query_params = extract_query_req(content)
-
             assistance_message = Message(
                 user_id=user_id,
                 role="assistant",
-                content={
-                    "type": "comfirmation_request",
-                    "request_type": "query_expenses",
-                    "data": {
-                        "message": "Bạn đang muốn tìm kiếm các khoản thu chi theo các tiêu chí dưới đây, bạn có muốn tìm không?",
-                        "data": query_params.model_dump()
-                    }
-                },
+                content=confirmation_content("query_expenses", result.model_dump(), template="query_confirm"),
                 timestamp=datetime.now(timezone.utc)
             )
             
         case "update_expenses":
-            update_params = extract_update_req(content)
-            
-
-            update_data = update_params.model_dump()
+            update_data = result.model_dump()
             update_id = update_data['id']
 
             expense = UserExpense.query.filter_by(user_id=user_id, id=update_id).first()
@@ -178,114 +371,67 @@ def process_user_text_message(user_id, content):
                 assistance_message = Message(
                     user_id=user_id,
                     role="assistant",
-                    content={
-                        "type": "message",
-                        "request_type": "update_expenses",
-                        "data": {
-                            "message": "Không tìm thấy khoản thu chi có ID này, hãy kiểm tra lại.",
-                        }
-                    },
+                    content=assistant_text_content(template="update_not_found", request_type="update_expenses"),
                     timestamp=datetime.now(timezone.utc)
                 )
             else:
                 assistance_message = Message(
                     user_id=user_id,
                     role="assistant",
-                    content={
-                        "type": "comfirmation_request",
-                        "request_type": "update_expenses",
-                        "data": {
-                            "message": "Khoản thu chi dưới đây sẽ được sửa với các tham số dưới đây, bạn có chắc không?",
-                            "data": update_data 
-                        }
-                    },
+                    content=confirmation_content("update_expenses", update_data, template="update_confirm"),
                     timestamp=datetime.now(timezone.utc)
                 )
 
         case "delete_expenses":
-                delete_params = extract_delete_req(content)
-                delete_data = delete_params.model_dump()
+                delete_data = result.model_dump()
 
                 delete_ids = delete_data.get("delete_ids")
                 start_date = delete_data.get("start_date")
                 end_date = delete_data.get("end_date")
 
-                base_query = UserExpense.query.filter(UserExpense.user_id == user_id)
-                
-                query_filters = []
-                expenses_found = []
-
+                criteria = None
                 if delete_ids:
-                    query_filters.append(UserExpense.id.in_(delete_ids))
-                
+                    criteria = {"delete_ids": delete_ids}
                 elif start_date or end_date:
-                    if start_date:
-                        query_filters.append(UserExpense.expense_date >= start_date)
-                    if end_date:
-                        query_filters.append(UserExpense.expense_date <= end_date)
+                    criteria = {"start_date": start_date, "end_date": end_date}
                 
-                if not query_filters:
+                if not criteria:
                     assistance_message = Message(
                         user_id=user_id,
                         role="assistant",
-                        content={
-                            "type": "message",
-                            "request_type": "delete_expenses",
-                            "data": {"message": "Bạn cần cung cấp (danh sách ID) hoặc (khoảng ngày) để xóa."}
-                        },
+                        content=assistant_text_content(template="delete_missing_criteria", request_type="delete_expenses"),
                         timestamp=datetime.now(timezone.utc)
                     )
                 else:
-                    expenses_found = base_query.filter(*query_filters).all()
+                    preview = create_delete_selection(user_id, criteria)
 
-                    if not expenses_found:
+                    if not preview:
                         assistance_message = Message(
                             user_id=user_id,
                             role="assistant",
-                            content={
-                                "type": "message",
-                                "data": {"message": "Không tìm thấy khoản chi nào khớp với tiêu chí của bạn."}
-                            },
+                            content=assistant_text_content(template="delete_not_found"),
                             timestamp=datetime.now(timezone.utc)
                         )
                     else:
-                        delete_expense_data = []
-                        for expense in expenses_found:
-                            delete_expense_data.append({
-                                "id": expense.id,
-                                "description": expense.description,
-                                "amount": expense.amount,
-                                "expense_date": expense.expense_date.isoformat()
-                            })
-                        
-                        message_text = f"Tìm thấy {len(delete_expense_data)} khoản chi. Bạn có chắc chắn muốn xóa chúng không?"
-
                         assistance_message = Message(
                             user_id=user_id,
                             role="assistant",
-                            content={
-                                "type": "comfirmation_request",
-                                "request_type": "delete_expenses",
-                                "data": {
-                                    "message": message_text,
-                                    "data": delete_expense_data
-                                }
-                            },
+                            content=confirmation_content(
+                                "delete_expenses",
+                                preview.pop("sample"),
+                                template="delete_confirm",
+                                params={"count": preview["count"]},
+                                extra={"selection": preview}
+                            ),
                             timestamp=datetime.now(timezone.utc)
                         )
 
 
         case "other":
-            other_reponse = other_message_process(content)
-
             assistance_message = Message(
                 user_id=user_id,
                 role="assistant",
-                content={
-                    "type": "message",
-                    "request_type": "other",
-                    "data": {"message": other_reponse.response}
-                },
+                content=assistant_text_content(result.response, request_type="other"),
                 timestamp=datetime.now(timezone.utc)
             )
 
@@ -293,22 +439,19 @@ def process_user_text_message(user_id, content):
         case _:
             raise ValueError("Unknown request type")
 
-    db.session.add(assistance_message)
-    db.session.commit()
+    commit_new_message(assistance_message)
+    return serialize_message(assistance_message)
+
+def process_user_text_message(user_id, content):
+    user_message = save_user_text_message(user_id, content)
+    request_type, result = extract_text_request(
+        content, lambda: build_conversation_context(user_id, before_id=user_message.id)
+    )
+    assistant_message = complete_text_request(user_id, request_type, result)
 
     return {
-        "user_message": {
-            "id": user_message.id,
-            "role": user_message.role,
-            "content": user_message.content,
-            "timestamp": user_message.timestamp.isoformat()
-        },
-        "assistant_message": {
-            "id": assistance_message.id,
-            "role": assistance_message.role,
-            "content": assistance_message.content,
-            "timestamp": assistance_message.timestamp.isoformat()
-        }
+        "user_message": serialize_message(user_message),
+        "assistant_message": assistant_message
     }
 
 #POST /api/v1/user/message
@@ -316,127 +459,81 @@ def process_assistant_response_message(user_id, content):
     assistance_message = Message(
         user_id=user_id,
         role="assistant",
-        content={
-            "type": "message",
-            "data": {"message": content}
-        },
+        content=assistant_text_content(content),
         timestamp=datetime.now(timezone.utc)
     )
-    db.session.add(assistance_message)
-    db.session.commit()
+    commit_new_message(assistance_message)
 
-    return {"assistant_message": {
-        "id": assistance_message.id,
-        "role": assistance_message.role,
-        "content": assistance_message.content,
-        "timestamp": assistance_message.timestamp.isoformat()
-    }}
+    return {"assistant_message": serialize_message(assistance_message)}
 
 
 # POST /api/v1/user/message
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-MAX_FILE_SIZE = 2 * 1024 * 1024 
-def process_user_image_message(user_id, image_file):
+def process_user_image_message(user_id, image_files):
+    """Store one or more receipt photos and answer with a single insert confirmation.
+
+    Several shots of a long receipt are preprocessed in a process pool and read
+    by the vision model concurrently, then their expenses are merged.
+    """
     UPLOAD_FOLDER = os.path.join(current_app.root_path, 'static', 'uploads')
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-    image = Image.open(image_file)
-    img_format = image.format.upper()
-
-    if img_format not in ["JPEG", "PNG"]:
-        raise Exception("Định dạng ảnh không được hỗ trợ")
-
-    image_file.seek(0, io.SEEK_END)
-    size_bytes = image_file.tell()
-    image_file.seek(0)  
-
-    ext = "jpg" if img_format == "JPEG" else "png"
-    
-    filename = f"{int(datetime.now(timezone.utc).timestamp()*1000)}_{user_id}_bill_image.{ext}"
-    save_path = os.path.join(UPLOAD_FOLDER, filename)
-
-    if size_bytes > MAX_FILE_SIZE:
-        buffer = io.BytesIO()
-        save_args = {"format": img_format, "optimize": True}
-        
-        if img_format == "JPEG":
-            save_args["quality"] = 70  
-            
-        image.save(buffer, **save_args)
-        buffer.seek(0)
-        with open(save_path, "wb") as f:
-            f.write(buffer.read())
-    else:
-        image_file.save(save_path) 
-
-
-    public_url = f"/static/uploads/{filename}"
-
-    user_message = Message(
-        user_id=user_id,
-        role="user",
-        content={
-            "type": "image_url",
-            "data": public_url  
-        },
-    )
-    db.session.add(user_message)
+    uploaded_at = int(datetime.now(timezone.utc).timestamp()*1000)
+    images = [
+        (image_file.read(), f"{uploaded_at}_{user_id}_{index}_bill_image")
+        for index, image_file in enumerate(image_files)
+    ]
+    with timed("image"):
+        prepared = prepare_images(images, UPLOAD_FOLDER)
+
+    user_messages = [
+        Message(user_id=user_id, role="user", content=image_content(
+            upload_url(filename),
+            extra={"variants": {name: upload_url(variant) for name, variant in variants.items()}}
+        ))
+        for filename, variants in prepared
+    ]
+    db.session.add_all(user_messages)
+    db.session.flush()
+    record_changes(user_id, ENTITY_MESSAGE, OP_UPSERT, [message.id for message in user_messages])
     db.session.commit()
 
-    model_response = extract_insert_req_from_local_image(save_path)
+    with timed("llm"):
+        model_responses = extract_all(
+            extract_insert_req_from_local_image, [os.path.join(UPLOAD_FOLDER, filename) for filename, _ in prepared]
+        )
+    accepted = [response for response in model_responses if response.error != "Unaccpeted Image"]
 
-    if model_response.error == "Unaccpeted Image":
+    if not accepted:
         assistance_message = Message(
             user_id=user_id,
             role="assistant",
-            content={
-                "type": "message",
-                "request_type": "other",
-                "data": {"message": "Hình ảnh không hợp lệ, vui lòng thử lại với hình ảnh khác."}
-            },
+            content=assistant_text_content(template="invalid_image", request_type="other"),
             timestamp=datetime.now(timezone.utc)
         )
-        db.session.add(assistance_message)
-        db.session.commit()
-        return {        
-            "assistant_message": {
-                "id": assistance_message.id,
-                "role": assistance_message.role,
-                "content": assistance_message.content,
-                "timestamp": assistance_message.timestamp.isoformat()
-            }
-        }
+        commit_new_message(assistance_message)
+        return {"assistant_message": serialize_message(assistance_message)}
 
+    expenses = merge_expenses([
+        [expense.model_dump() for expense in response.expenses or []] for response in accepted
+    ])
+    rejected = [index for index, response in enumerate(model_responses) if response.error == "Unaccpeted Image"]
     assistance_message = Message(
         user_id=user_id,
         role="assistant",
-        content={
-            "type": "comfirmation_request",
-            "request_type": "insert_expenses",
-            "data": {
-                "message": "Các khoản dưới đây đã được ghi nhận, bạn có muốn thêm không?",
-                "data": model_response.model_dump()
-            }
-        },
+        content=confirmation_content(
+            "insert_expenses", {"expenses": expenses, "error": None}, template="insert_confirm",
+            extra={"rejected_images": rejected} if rejected else None
+        ),
         timestamp=datetime.now(timezone.utc)
     )
-    db.session.add(assistance_message)
-    db.session.commit()
+    commit_new_message(assistance_message)
 
-    return {
-        "user_message": {
-            "id": user_message.id,
-            "role": user_message.role,
-            "content": user_message.content,
-            "timestamp": user_message.timestamp.isoformat()
-        },
-        "assistant_message": {
-            "id": assistance_message.id,
-            "role": assistance_message.role,
-            "content": assistance_message.content,
-            "timestamp": assistance_message.timestamp.isoformat()
-        }
-    }
+    response = {"assistant_message": serialize_message(assistance_message)}
+    if len(user_messages) == 1:
+        response["user_message"] = serialize_message(user_messages[0])
+    else:
+        response["user_messages"] = [serialize_message(message) for message in user_messages]
+    return response
     
 
     # ##OCR TEST
@@ -461,101 +558,61 @@ def process_user_image_message(user_id, image_file):
 # DELETE /api/v1/user/message/<message_id>
 def delete_user_message(user_id, message_id):
     message = Message.query.filter_by(id=message_id, user_id=user_id).first()
+    if message:
+        db.session.delete(message)
+    else:
+        message = delete_archived_message(user_id, message_id)
     if not message:
         raise NotFoundError("Message not found or does not belong to the user")
-    db.session.delete(message)
+    reset_history(user_id)
+    record_changes(user_id, ENTITY_MESSAGE, OP_DELETE, [message_id])
     db.session.commit()
     return message
 
 # DELETE /api/v1/user/message
 def delete_all_user_messages(user_id):
     delete_count = Message.query.filter_by(user_id=user_id).delete()
+    delete_count += delete_all_archived_messages(user_id)
+    reset_history(user_id)
+    record_changes(user_id, ENTITY_MESSAGE, OP_CLEAR)
     db.session.commit()
     return delete_count
 
 # GET /api/v1/user/expenses?page=1&pageSize=20&keyword=&start_date=&end_date=&min_amount=&max_amount=
+@read_only
 def get_user_expenses(user_id, filters, page=1, page_size=20):
     try:
-        query = UserExpense.query.filter_by(user_id=user_id)
-
-        if filters.get("keyword"):
-            query = query.filter(UserExpense.description.ilike(f"%{filters['keyword']}%"))
-
-        start_date_str = filters.get("start_date")
-        if start_date_str:
-            try:
-                start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-                query = query.filter(UserExpense.expense_date >= start_date)
-            except ValueError:
-                return {"error": "Invalid start_date format. Use YYYY-MM-DD."}, 400
-
-        end_date_str = filters.get("end_date")
-        if end_date_str:
-            try:
-                end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-                query = query.filter(UserExpense.expense_date <= end_date)
-            except ValueError:
-                return {"error": "Invalid end_date format. Use YYYY-MM-DD."}, 400
-
-        min_amount = filters.get("min_amount")
-        if min_amount:
-            try:
-                min_amount = float(min_amount)
-                query = query.filter(UserExpense.amount >= min_amount)
-            except ValueError:
-                return {"error": "Invalid min_amount format. Must be a number."}, 400
-
-        max_amount = filters.get("max_amount")
-        if max_amount:
-            try:
-                max_amount = float(max_amount)
-                query = query.filter(UserExpense.amount <= max_amount)
-            except ValueError:
-                return {"error": "Invalid max_amount format. Must be a number."}, 400
+        try:
+            conditions = expense_filter_conditions(user_id, filters)
+        except ValueError as e:
+            return {"error": str(e)}, 400
 
         if page < 1:
             page = 1
         if page_size < 1 or page_size > 50:
             page_size = 20 
 
-        total_records = query.count()
-
-        total_pages = (total_records + page_size - 1) // page_size
-
-        sort_info = filters.get("sort", {})
-        sort_field_name = sort_info.get("field", "expense_date") 
-        sort_order = sort_info.get("order", "desc")
-
-        sortable_fields = {
-            "expense_date": UserExpense.expense_date,
-            "amount": UserExpense.amount
-        }
-
-        sort_column = sortable_fields.get(sort_field_name, UserExpense.expense_date)
+        # The window count is evaluated before LIMIT, so one query returns the page and the total.
+        statement = (
+            select_expenses(func.count().over().label("total_records"))
+            .where(*conditions)
+            .order_by(expense_sort_order(filters))
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        )
+        expenses = fetch_records(statement)
 
-        if sort_order.lower() == "desc":
-            query = query.order_by(sort_column.desc())
+        if expenses:
+            total_records = expenses[0].total_records
+        elif page == 1:
+            total_records = 0
         else:
-            query = query.order_by(sort_column.asc()) 
+            total_records = fetch_scalar(select(func.count()).select_from(expense_table).where(*conditions))
 
-        expenses = (
-            query
-                 .offset((page - 1) * page_size)
-                 .limit(page_size)
-                 .all()
-        )
+        total_pages = (total_records + page_size - 1) // page_size
 
         return {
-            "expenses": [
-                {
-                    "id": exp.id,
-                    "amount": exp.amount,
-                    "description": exp.description,
-                    "expense_date": exp.expense_date.isoformat(),
-                    "created_at": exp.created_at.isoformat(),
-                    "updated_at": exp.updated_at.isoformat(),
-                } for exp in expenses
-            ],
+            "expenses": [serialize_expense(exp) for exp in expenses],
             "total_pages": total_pages,
             "current_page": page,
             "page_size": page_size,
@@ -565,68 +622,241 @@ def get_user_expenses(user_id, filters, page=1, page_size=20):
     except Exception as e:
         return {"error": f"An error occurred: {str(e)}"}, 500
 
+# GET /api/v1/user/expenses/export?format=csv|ndjson&gzip=1&keyword=&startDate=&endDate=&minAmount=&maxAmount=
+EXPORT_CHUNK_ROWS = 1000
+def export_user_expenses(user_id, filters, export_format, compress=False):
+    conditions = expense_filter_conditions(user_id, filters)
+
+    # yield_per makes psycopg2 use a server-side cursor, memory stays at one chunk of rows.
+    statement = (
+        select_expenses()
+        .where(*conditions)
+        .order_by(expense_sort_order(filters))
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    )
+
+    # The rows are read while the response streams, after this function returned.
+    def partitions():
+        with replica_reads():
+            result = db.session.connection().execute(statement)
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    chunks = csv_chunks(partitions()) if export_format == "csv" else ndjson_chunks(partitions())
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
+
 # GET /api/v1/user/expenses/{id}
+@read_only
 def get_user_single_expense(user_id, expense_id):
-    exp = UserExpense.query.filter_by(user_id=user_id, id=expense_id).first()
+    records = fetch_records(
+        select_expenses().where(expense_table.c.user_id == user_id, expense_table.c.id == expense_id)
+    )
+    exp = records[0] if records else None
     if not exp:
         raise NotFoundError("Expense not found or does not belong to the user")
-    return {
-        "id": exp.id,
-        "amount": exp.amount,
-        "description": exp.description,
-        "expense_date": exp.expense_date.isoformat(),
-        "created_at": exp.created_at.isoformat(),
-        "updated_at": exp.updated_at.isoformat(),
-    }
+    return serialize_expense(exp)
+
+def expense_fields(data):
+    """Column values for the expense fields present in a request payload."""
+    fields = {}
+    if "amount" in data:
+        fields["amount"] = to_amount(data["amount"])
+    if "description" in data:
+        fields["description"] = data["description"]
+    if "expense_date" in data:
+        fields["expense_date"] = datetime.strptime(data["expense_date"], "%Y-%m-%d")
+    return fields
+
+def insert_expenses(user_id, rows):
+    """One multi-row INSERT ... RETURNING, rows come back in the order given."""
+    if not rows:
+        return []
+    now = datetime.now(timezone.utc)
+    return db.session.execute(
+        insert(expense_table).returning(*EXPENSE_RECORD_COLUMNS, sort_by_parameter_order=True),
+        [{**fields, "user_id": user_id, "created_at": now, "updated_at": now} for fields in rows]
+    ).all()
+
+def update_expenses(user_id, changes):
+    """Apply {expense_id: fields} with one UPDATE ... FROM (VALUES ...) ... RETURNING.
+
+    A NULL in the VALUES list keeps the stored value, the columns are NOT NULL.
+    Returns {expense_id: row} for the user's rows that were found.
+    """
+    if not changes:
+        return {}
+    changed = values(
+        column("id", Integer), column("amount", BigInteger),
+        column("description", String), column("expense_date", DateTime),
+        name="changed"
+    ).data([
+        (expense_id, fields.get("amount"), fields.get("description"), fields.get("expense_date"))
+        for expense_id, fields in changes.items()
+    ])
+    # A column that is NULL on every row comes out as text, the casts pin the types.
+    rows = db.session.execute(
+        update(expense_table)
+        .where(expense_table.c.user_id == user_id, expense_table.c.id == changed.c.id)
+        .values(
+            amount=func.coalesce(cast(changed.c.amount, BigInteger), expense_table.c.amount),
+            description=func.coalesce(cast(changed.c.description, String), expense_table.c.description),
+            expense_date=func.coalesce(cast(changed.c.expense_date, DateTime), expense_table.c.expense_date),
+            updated_at=datetime.now(timezone.utc)
+        )
+        .returning(*EXPENSE_RECORD_COLUMNS)
+    ).all()
+    return {row.id: row for row in rows}
+
+def delete_expenses(user_id, expense_ids):
+    """One DELETE ... RETURNING id, returns the ids that belonged to the user."""
+    if not expense_ids:
+        return set()
+    return set(db.session.execute(
+        delete(expense_table)
+        .where(expense_table.c.user_id == user_id, expense_table.c.id.in_(expense_ids))
+        .returning(expense_table.c.id)
+    ).scalars())
 
 # POST /api/v1/user/expenses
 def add_user_expenses(user_id, data):
-    added_expenses = []
-    for expense in data:
-        new_expense = UserExpense(
-            user_id=user_id,
-            amount=expense["amount"],
-            description=expense["description"],
-            expense_date=datetime.strptime(expense["expense_date"], "%Y-%m-%d").date(),
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc)
+    added_expenses = insert_expenses(user_id, [expense_fields(expense) for expense in data])
+    record_changes(user_id, ENTITY_EXPENSE, OP_UPSERT, [expense.id for expense in added_expenses])
+    db.session.commit()
+    return [serialize_expense(expense) for expense in added_expenses]
+
+# POST /api/v1/user/expenses/batch
+def apply_expense_batch(user_id, operations):
+    """Apply a client's queued inserts, updates and deletes in one transaction.
+
+    Each kind runs as one set-based statement, inserts then updates then
+    deletes: an id that is both updated and deleted ends up deleted, several
+    updates of one id are merged with later fields winning. Results follow
+    the request order; a missing id is reported, not an error, since another
+    device may already have deleted it.
+    """
+    inserts, changes, delete_ids = [], {}, set()
+    for operation in operations:
+        if operation["op"] == "insert":
+            inserts.append(expense_fields(operation["expense"]))
+        elif operation["op"] == "update":
+            changes.setdefault(operation["id"], {}).update(expense_fields(operation["expense"]))
+        else:
+            delete_ids.add(operation["id"])
+
+    inserted = insert_expenses(user_id, inserts)
+    updated = update_expenses(user_id, {
+        expense_id: fields for expense_id, fields in changes.items() if expense_id not in delete_ids
+    })
+    deleted = delete_expenses(user_id, delete_ids)
+
+    record_changes(user_id, ENTITY_EXPENSE, OP_UPSERT, [row.id for row in inserted] + list(updated))
+    record_changes(user_id, ENTITY_EXPENSE, OP_DELETE, list(deleted))
+    db.session.commit()
+
+    results = []
+    inserted_rows = iter(inserted)
+    for index, operation in enumerate(operations):
+        result = {"index": index, "op": operation["op"]}
+        if operation["op"] == "insert":
+            result.update(status="ok", expense=serialize_expense(next(inserted_rows)))
+            if "ref" in operation:
+                result["ref"] = operation["ref"]
+        elif operation["op"] == "update" and operation["id"] in updated:
+            result.update(status="ok", expense=serialize_expense(updated[operation["id"]]))
+        elif operation["op"] == "update" and operation["id"] in deleted:
+            result.update(status="deleted", id=operation["id"])
+        elif operation["op"] == "delete" and operation["id"] in deleted:
+            result.update(status="ok", id=operation["id"])
+        else:
+            result.update(status="not_found", id=operation["id"])
+        results.append(result)
+
+    return results
+
+# POST /api/v1/user/expenses/import
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 20
+def import_user_expenses(user_id, binary_stream, batch_size=IMPORT_BATCH_SIZE):
+    """Import a bank statement CSV batch by batch, yielding a progress dict after each batch.
+
+    A row is a duplicate when the same (date, amount, description) was stored
+    before this import started; identical rows within the file are all kept.
+    """
+    progress = {"processed": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    started_at = datetime.now(timezone.utc)
+    errors = []
+    batch = []
+
+    def existing_keys(rows):
+        dates = [row["expense_date"] for row in rows]
+        existing = fetch_records(
+            select(func.date(expense_table.c.expense_date).label("expense_date"),
+                   expense_table.c.amount, expense_table.c.description)
+            .where(
+                expense_table.c.user_id == user_id,
+                expense_table.c.expense_date >= min(dates),
+                expense_table.c.expense_date < max(dates) + timedelta(days=1),
+                # Earlier batches of this file are not duplicates of it.
+                expense_table.c.created_at < started_at
+            )
         )
-        db.session.add(new_expense)
+        return {dedupe_key(row.expense_date, row.amount, row.description) for row in existing}
+
+    def flush(rows):
+        already_stored = existing_keys(rows)
+        new_rows = []
+        for row, key in ((row, row.pop("key")) for row in rows):
+            if key in already_stored:
+                progress["duplicates"] += 1
+            else:
+                new_rows.append(row)
+
+        if new_rows:
+            now = datetime.now(timezone.utc)
+            inserted_ids = db.session.execute(
+                insert(UserExpense).returning(UserExpense.id),
+                [{**row, "user_id": user_id, "created_at": now, "updated_at": now} for row in new_rows]
+            ).scalars().all()
+            record_changes(user_id, ENTITY_EXPENSE, OP_UPSERT, inserted_ids)
+            progress["inserted"] += len(inserted_ids)
         db.session.commit()
-        added_expenses.append({
-            "id": new_expense.id,
-            "amount": new_expense.amount,
-            "description": new_expense.description,
-            "expense_date": new_expense.expense_date.isoformat(),
-            "created_at": new_expense.created_at.isoformat(),
-            "updated_at": new_expense.updated_at.isoformat()
-        })
-    return added_expenses
+
+    for line_number, raw_row, columns in read_csv_rows(binary_stream):
+        progress["processed"] += 1
+        try:
+            row = normalize_row(raw_row, columns)
+        except ValueError as e:
+            progress["invalid"] += 1
+            if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                errors.append({"line": line_number, "error": str(e)})
+            continue
+
+        batch.append({**row, "key": dedupe_key(row["expense_date"], row["amount"], row["description"])})
+
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+            yield dict(progress)
+
+    if batch:
+        flush(batch)
+
+    yield {**progress, "done": True, "errors": errors}
 
 # PUT /api/v1/user/expenses/<expense_id>
 def update_user_expense(user_id, expense_id, data):
-    expense = UserExpense.query.filter_by(id=expense_id, user_id=user_id).first()
+    expense = update_expenses(user_id, {expense_id: expense_fields(data)}).get(expense_id)
     if not expense:
         raise NotFoundError("Expense not found or does not belong to the user")
 
-    if "amount" in data:
-        expense.amount = data["amount"]
-    if "description" in data:
-        expense.description = data["description"]
-    if "expense_date" in data:
-        expense.expense_date = datetime.strptime(data["expense_date"], "%Y-%m-%d").date()
-
-    expense.updated_at = datetime.now(timezone.utc)
+    record_changes(user_id, ENTITY_EXPENSE, OP_UPSERT, [expense_id])
     db.session.commit()
 
-    return {
-        "id": expense.id,
-        "amount": expense.amount,
-        "description": expense.description,
-        "expense_date": expense.expense_date.isoformat(),
-        "created_at": expense.created_at.isoformat(),
-        "updated_at": expense.updated_at.isoformat()
-    }
+    return serialize_expense(expense)
 
 # DELETE /api/v1/user/expenses/<expense_id>
 def delete_user_expense(user_id, expense_id):
@@ -634,27 +864,160 @@ def delete_user_expense(user_id, expense_id):
     if not expense:
         raise NotFoundError("Expense not found or does not belong to the user")
     db.session.delete(expense)
+    record_changes(user_id, ENTITY_EXPENSE, OP_DELETE, [expense_id])
     db.session.commit()
     return expense
 
 # DELETE /api/v1/user/expenses/<expense_id>
 def delete_many_user_expenses(user_id, expense_ids):
-    expenses_to_delete = UserExpense.query.filter(
-        UserExpense.user_id == user_id,
-        UserExpense.id.in_(expense_ids)
-    ).all()
-    
-    deleted_count = len(expenses_to_delete)
-        
-    for expense in expenses_to_delete:
-        db.session.delete(expense) 
+    deleted_ids = delete_expenses(user_id, expense_ids)
+    record_changes(user_id, ENTITY_EXPENSE, OP_DELETE, list(deleted_ids))
     db.session.commit()
-    
-    return deleted_count
+
+    return len(deleted_ids)
+
+# GET /api/v1/user/changes?since=<cursor>&limit=500
+def get_user_changes(user_id, since, limit=500):
+    if limit < 1 or limit > 1000:
+        limit = 500
+
+    if since is None:
+        return {
+            "cursor": current_version(user_id),
+            "has_more": False,
+            "expenses": {"upserted": [], "deleted": [], "cleared": False},
+            "messages": {"upserted": [], "deleted": [], "cleared": False},
+        }
+
+    changes, cursor, has_more = collect_changes(user_id, since, limit)
+
+    def split_changes(entity_changes, table, select_rows, serialize, load_missing=None):
+        upsert_ids = [entity_id for entity_id, op in entity_changes["ops"].items() if op == OP_UPSERT]
+        deleted_ids = [entity_id for entity_id, op in entity_changes["ops"].items() if op == OP_DELETE]
+
+        rows = []
+        if upsert_ids:
+            rows = fetch_records(
+                select_rows().where(table.c.user_id == user_id, table.c.id.in_(upsert_ids))
+            )
+        found_ids = {row.id for row in rows}
+        if load_missing and len(found_ids) < len(upsert_ids):
+            rows += load_missing([entity_id for entity_id in upsert_ids if entity_id not in found_ids])
+            found_ids = {row.id for row in rows}
+        # Rows deleted by a change past this page no longer exist, report them as deleted.
+        deleted_ids.extend(entity_id for entity_id in upsert_ids if entity_id not in found_ids)
+
+        return {
+            "upserted": [serialize(row) for row in rows],
+            "deleted": deleted_ids,
+            "cleared": entity_changes["cleared"],
+        }
+
+    return {
+        "cursor": cursor,
+        "has_more": has_more,
+        "expenses": split_changes(changes[ENTITY_EXPENSE], expense_table, select_expenses, serialize_expense),
+        "messages": split_changes(
+            changes[ENTITY_MESSAGE], message_table, select_messages, serialize_message,
+            load_missing=lambda message_ids: load_archived_messages(user_id, message_ids)
+        ),
+    }
+
+# GET /api/v1/user/message/<message_id>/results?page=1&pageSize=20
+@read_only
+def get_query_message_results(user_id, message_id, page=1, page_size=20):
+    records = fetch_records(
+        select_messages().where(message_table.c.user_id == user_id, message_table.c.id == message_id)
+    ) or load_archived_messages(user_id, [message_id])
+    content = render_content(records[0].content) if records else None
+    if not content or content.get("request_type") != "query_expenses" or content.get("type") != "comfirmation_request":
+        raise NotFoundError("Query message not found or does not belong to the user")
+
+    query_params = content["data"]["data"]
+    conditions = expense_filter_conditions(user_id, {
+        "start_date": query_params.get("start_date"),
+        "end_date": query_params.get("end_date"),
+        "min_amount": query_params.get("min_amount"),
+        "max_amount": query_params.get("max_amount"),
+        "key_words": query_params.get("key_words"),
+    })
+
+    if page < 1:
+        page = 1
+    if page_size < 1 or page_size > 50:
+        page_size = 20
+
+    # ROLLUP returns one row per day plus a grand-total row whose day is NULL.
+    day = func.date(expense_table.c.expense_date)
+    aggregate_rows = fetch_records(
+        select(
+            day.label("day"),
+            func.count().label("count"),
+            amount_total().label("total"),
+            amount_total(expense_table.c.amount > 0).label("total_income"),
+            amount_total(expense_table.c.amount < 0).label("total_expense"),
+        )
+        .where(*conditions)
+        .group_by(func.rollup(day))
+        .order_by(day)
+    )
+
+    grand_total = next((row for row in aggregate_rows if row.day is None), None)
+    total_records = grand_total.count if grand_total else 0
+
+    expenses = []
+    if total_records:
+        expenses = fetch_records(
+            select_expenses()
+            .where(*conditions)
+            .order_by(expense_table.c.expense_date.desc(), expense_table.c.id.desc())
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        )
+
+    return {
+        "query": query_params,
+        "aggregates": {
+            "count": total_records,
+            "total": grand_total.total if grand_total else 0,
+            "total_income": grand_total.total_income if grand_total else 0,
+            "total_expense": grand_total.total_expense if grand_total else 0,
+            "by_day": [
+                {"date": row.day, "count": row.count, "total": row.total}
+                for row in aggregate_rows if row.day is not None
+            ],
+        },
+        "expenses": [serialize_expense(exp) for exp in expenses],
+        "current_page": page,
+        "page_size": page_size,
+        "total_pages": (total_records + page_size - 1) // page_size,
+        "total_records": total_records,
+    }
+
+# POST /api/v1/user/expenses/selections/<token>/delete
+def delete_selected_expenses(user_id, token, exclude_ids=None):
+    selection = ExpenseSelection.query.filter_by(token=token, user_id=user_id).first()
+    if not selection or selection.expires_at < datetime.now(timezone.utc).replace(tzinfo=None):
+        raise NotFoundError("Selection not found or expired")
+
+    conditions = delete_selection_conditions(user_id, selection.criteria, selection.max_expense_id)
+    if exclude_ids:
+        conditions.append(expense_table.c.id.not_in(exclude_ids))
+
+    deleted_ids = db.session.execute(
+        expense_table.delete().where(*conditions).returning(expense_table.c.id)
+    ).scalars().all()
+
+    record_changes(user_id, ENTITY_EXPENSE, OP_DELETE, deleted_ids)
+    db.session.delete(selection)
+    db.session.commit()
+    return len(deleted_ids)
 
 #GET /api/v1/user/statistics/summary
-def get_date_range(range_str):
-    today = datetime.now(timezone.utc)
+def get_date_range(range_str, today=None):
+    # expense_date is a naive UTC timestamp; naive bounds keep the comparison
+    # timestamp-to-timestamp, which lets Postgres prune partitions at plan time.
+    today = today or datetime.now(timezone.utc).replace(tzinfo=None)
     end_date = today.replace(hour=23, minute=59, second=59, microsecond=999999)
     start_date = None
 
@@ -671,47 +1034,43 @@ def get_date_range(range_str):
 
     return start_date, end_date
 
+@read_only
 def get_user_statistics_summary(user_id, range, top):
 
     start_date, end_date = get_date_range(range)
 
-    base_query = db.session.query(UserExpense).filter(
-            UserExpense.user_id == user_id,
-            UserExpense.expense_date >= start_date,
-            UserExpense.expense_date <= end_date
+    totals = fetch_records(
+        select(
+            amount_total(expense_table.c.amount > 0).label("total_income"),
+            amount_total(expense_table.c.amount < 0).label("total_expense"),
+        ).where(
+            expense_table.c.user_id == user_id,
+            expense_table.c.expense_date >= start_date,
+            expense_table.c.expense_date <= end_date
         )
-    
-    income_query = base_query.filter(UserExpense.amount > 0).with_entities(
-            func.coalesce(func.sum(UserExpense.amount), 0)
+    )[0]
+
+    top_base = select_expenses().where(
+            expense_table.c.user_id == user_id,
+            expense_table.c.expense_date >= start_date,
+            expense_table.c.expense_date <= end_date
         )
-    expense_query = base_query.filter(UserExpense.amount < 0).with_entities(
-        func.coalesce(func.sum(UserExpense.amount), 0)
-    )
 
-    total_income = income_query.scalar()
-    total_expense = expense_query.scalar()
+    top_incomes = fetch_records(
+        top_base.where(expense_table.c.amount > 0)
+                .order_by(expense_table.c.amount.desc())
+                .limit(int(top))
+    )
 
-    top_incomes = base_query.filter(UserExpense.amount > 0)\
-                                .order_by(UserExpense.amount.desc())\
-                                .limit(top).all()
-                                
-    top_expenses = base_query.filter(UserExpense.amount < 0)\
-                                 .order_by(UserExpense.amount.asc())\
-                                 .limit(top).all()
-    
-    def serialize_expense(expense):
-            return {
-                "id": expense.id,
-                "description": expense.description,
-                "amount": expense.amount,
-                "expense_date": expense.expense_date.isoformat(),
-                "created_at": expense.created_at.isoformat(),
-                "updated_at": expense.updated_at.isoformat()
-            }
+    top_expenses = fetch_records(
+        top_base.where(expense_table.c.amount < 0)
+                .order_by(expense_table.c.amount.asc())
+                .limit(int(top))
+    )
     
     return {
-        "total_income": total_income,
-        "total_expense": total_expense,
+        "total_income": totals.total_income,
+        "total_expense": totals.total_expense,
         "top_incomes": [serialize_expense(exp) for exp in top_incomes],
         "top_expenses": [serialize_expense(exp) for exp in top_expenses],
     }
@@ -745,40 +1104,43 @@ def process_chart_data(results, start_date, end_date, group_by_format):
     sorted_map = dict(sorted(data_map.items()))
     return list(sorted_map.keys()), list(sorted_map.values())
 
+@read_only
 def get_user_statistics_chart_data(user_id, range):
     start_date, end_date = get_date_range(range)
 
     unit = "k"
-    divider = 1000.0
     group_by_format = 'day' 
-    group_by_field = func.date(UserExpense.expense_date)
+    group_by_field = func.date(expense_table.c.expense_date)
 
     if range == "1y":
         unit = "tr" 
-        divider = 1000000.0 
         group_by_format = 'month'
-        group_by_field = func.to_char(UserExpense.expense_date, 'YYYY-MM')
+        group_by_field = func.to_char(expense_table.c.expense_date, 'YYYY-MM')
 
-    base_query = db.session.query(
+    # Income and expense per bucket in one pass, summed as integers.
+    results = fetch_records(
+        select(
             group_by_field.label('key'),
-            func.sum(UserExpense.amount).label('total')
-        ).filter(
-            UserExpense.user_id == user_id,
-            UserExpense.expense_date >= start_date,
-            UserExpense.expense_date <= end_date
+            amount_total(expense_table.c.amount > 0).label('income'),
+            amount_total(expense_table.c.amount < 0).label('expense')
+        ).where(
+            expense_table.c.user_id == user_id,
+            expense_table.c.expense_date >= start_date,
+            expense_table.c.expense_date <= end_date
         ).group_by('key')
+    )
 
-    income_results = base_query.filter(UserExpense.amount > 0).all()
-    expense_results = base_query.filter(UserExpense.amount < 0).all()
+    income_raw = [(str(row.key), row.income) for row in results if row.income]
+    expense_raw = [(str(row.key), -row.expense) for row in results if row.expense]
 
-    total_income_raw = sum(float(row[1]) for row in income_results)
-    total_expense_raw = sum(float(abs(row[1])) for row in expense_results)
+    total_income_raw = sum(total for _, total in income_raw)
+    total_expense_raw = sum(total for _, total in expense_raw)
 
-    income_raw = [(str(row[0]), float(row[1] / divider)) for row in income_results]
-    expense_raw = [(str(row[0]), float(abs(row[1]) / divider)) for row in expense_results]
+    income_labels, income_totals = process_chart_data(income_raw, start_date, end_date, group_by_format)
+    expense_labels, expense_totals = process_chart_data(expense_raw, start_date, end_date, group_by_format)
 
-    income_labels, income_data = process_chart_data(income_raw, start_date, end_date, group_by_format)
-    expense_labels, expense_data = process_chart_data(expense_raw, start_date, end_date, group_by_format)
+    income_data = [scale_amount(total, unit) for total in income_totals]
+    expense_data = [scale_amount(total, unit) for total in expense_totals]
     
 
     final_labels = []
@@ -0,0 +1,51 @@
+import io
+import json
+from types import SimpleNamespace
+
+from flask import Flask
+
+import routes
+from importers import read_csv_rows
+from json_provider import FastJSONProvider
+from services import IMPORT_BATCH_SIZE
+
+ROWS = IMPORT_BATCH_SIZE * 3 + 1
+
+
+def counting_import(user_id, binary_stream, batch_size=IMPORT_BATCH_SIZE):
+    """Stands in for import_user_expenses: reads the upload lazily, batch by batch, without a database."""
+    processed = 0
+    for _ in read_csv_rows(binary_stream):
+        processed += 1
+        if processed % batch_size == 0:
+            yield {"processed": processed}
+    yield {"processed": processed, "done": True}
+
+
+def make_client(monkeypatch):
+    monkeypatch.setattr(routes, "jwt_token_verify", lambda headers: SimpleNamespace(id=1))
+    monkeypatch.setattr(routes, "import_user_expenses", counting_import)
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(routes.user_bp, url_prefix="/api/v1/user")
+    return app.test_client()
+
+
+def test_import_reads_every_batch_after_the_request_is_closed(monkeypatch):
+    client = make_client(monkeypatch)
+    csv_body = "date,amount,description\n" + "".join(
+        f"2025-01-{n % 28 + 1:02d},-{n + 1}000,Cà phê {n}\n" for n in range(ROWS)
+    )
+
+    response = client.post(
+        "/api/v1/user/expenses/import",
+        data={"file": (io.BytesIO(csv_body.encode("utf-8")), "statement.csv")},
+        content_type="multipart/form-data",
+    )
+    # The body is streamed only now, after the view has returned.
+    progress = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert not any("error" in item for item in progress)
+    assert progress[-1] == {"processed": ROWS, "done": True}
+    assert len(progress) == ROWS // IMPORT_BATCH_SIZE + 1
@@ -0,0 +1,9 @@
+"""WSGI entry point for production servers.
+
+    flask --app app init-db
+    gunicorn -c gunicorn.conf.py
+
+See gunicorn.conf.py for worker, thread and preload settings, and asgi.py for
+the async serving mode.
+"""
+from app import app as application